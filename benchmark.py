@@ -0,0 +1,204 @@
+# benchmark.py
+# ------------
+# Licensing Information:  You are free to use or extend these projects for
+# educational purposes provided that (1) you do not distribute or publish
+# solutions, (2) you retain this notice, and (3) you provide clear
+# attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+#
+# Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+# The core projects and autograders were primarily created by John DeNero
+# (denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+# Student side autograding was added by Brad Miller, Nick Hay, and
+# Pieter Abbeel (pabbeel@cs.berkeley.edu).
+
+
+"""
+Benchmarks for the game engine.
+
+  python benchmark.py --layout originalClassic --numStates 20000
+    - reports the memory retained per GameState
+
+  python benchmark.py --search -a "" -a engine=pvs -a iterative,aspiration=20
+    - counts the states AlphaBetaAgent generates on the test_cases/q3
+      problems, once per set of agent arguments
+
+  python benchmark.py --checkRules --layout smallClassic,originalClassic
+    - plays random games with GameState and FastGameState side by side and
+      reports every move after which they disagree
+"""
+import gc
+import glob
+import os
+import random
+import sys
+import tracemalloc
+
+import layout
+import multiAgents
+import multiagentTestClasses
+import testParser
+from pacman import FastGameState, GameState, parseAgentArgs
+
+
+def stateMemory(layoutName='originalClassic', numStates=20000, seed=0):
+    """
+    Returns the average number of bytes retained per GameState when
+    numStates states from random playouts are kept alive at once, the way
+    a transposition table keeps them.
+    """
+    lay = layout.getLayout(layoutName)
+    if lay == None:
+        raise Exception("The layout " + layoutName + " cannot be found")
+    random.seed(seed)
+    start = GameState()
+    start.initialize(lay, lay.getNumGhosts())
+    GameState.getAndResetExplored()
+    gc.collect()
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    states = []
+    state, agentIndex = start, 0
+    while len(states) < numStates:
+        if state.isWin() or state.isLose():
+            state, agentIndex = start, 0
+        action = random.choice(state.getLegalActions(agentIndex))
+        state = state.generateSuccessor(agentIndex, action)
+        states.append(state)
+        agentIndex = (agentIndex + 1) % state.getNumAgents()
+    # Only count the states themselves, not the bookkeeping around them
+    GameState.getAndResetExplored()
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before - sys.getsizeof(states)
+    tracemalloc.stop()
+    return used / float(numStates)
+
+
+def searchNodes(agentArgs, testDir=os.path.join('test_cases', 'q3'), numStates=10, seed=0):
+    """
+    Returns a list of (test name, states generated) pairs for AlphaBetaAgent
+    built with the agentArgs dictionary.  Game tree tests are searched at
+    their own depth; the Pacman game test at each of numStates states along
+    a random playout of its layout.  The trees only score states at their
+    full depth, so they are never searched iteratively, and their states
+    have no key(), so they are searched without a transposition table.
+    """
+    agentArgs = dict(agentArgs)
+    counts = []
+    for path in sorted(glob.glob(os.path.join(testDir, '*.test'))):
+        testDict = testParser.TestParser(path).parse()
+        name = os.path.basename(path)[:-len('.test')]
+        if testDict['class'] == 'GraphGameTreeTest':
+            problem = multiagentTestClasses.parseTreeProblem(testDict)
+            args = dict(agentArgs, depth=testDict['depth'], iterative='False')
+            args.pop('tt', None)
+            args.pop('ttPolicy', None)
+            agent = multiAgents.AlphaBetaAgent(**args)
+            agent.getAction(problem.startState)
+            counts.append((name, agent.nodes))
+        elif testDict['class'] == 'PacmanGameTreeTest':
+            lay = layout.Layout([l.strip() for l in testDict['layout'].split('\n')])
+            args = dict({'depth': testDict['depth']}, **agentArgs)
+            agent = multiAgents.AlphaBetaAgent(**args)
+            agent.registerInitialState(None)
+            random.seed(seed)
+            state = GameState()
+            state.initialize(lay, lay.getNumGhosts())
+            total = 0
+            for i in range(numStates):
+                if state.isWin() or state.isLose():
+                    break
+                agent.getAction(state)
+                total += agent.nodes
+                # Play a random move for everyone, so the states differ
+                for agentIndex in range(state.getNumAgents()):
+                    if state.isWin() or state.isLose():
+                        break
+                    action = random.choice(state.getLegalActions(agentIndex))
+                    state = state.generateSuccessor(agentIndex, action)
+            counts.append((name, total))
+    return counts
+
+
+def checkRules(layoutNames, numGames=20, seed=0):
+    """
+    Plays numGames random games on each layout with a GameState and a
+    FastGameState in step, comparing after every move their key(), the legal
+    actions of the agent to move, and whether the game is over.  Returns the
+    number of moves played and a list of (layout, game, move) for the games
+    in which the two first disagreed.
+    """
+    moves = 0
+    mismatches = []
+    for layoutName in layoutNames:
+        lay = layout.getLayout(layoutName)
+        if lay == None:
+            raise Exception("The layout " + layoutName + " cannot be found")
+        for game in range(numGames):
+            random.seed(seed + game)
+            state = GameState()
+            state.initialize(lay, lay.getNumGhosts())
+            fastState = FastGameState.fromGameState(state)
+            agentIndex = 0
+            move = 0
+            while True:
+                legal = state.getLegalActions(agentIndex)
+                if (state.key() != fastState.key()
+                        or legal != fastState.getLegalActions(agentIndex)
+                        or state.isWin() != fastState.isWin()
+                        or state.isLose() != fastState.isLose()):
+                    mismatches.append((layoutName, game, move))
+                    break
+                if not legal:
+                    break
+                action = random.choice(legal)
+                state = state.generateSuccessor(agentIndex, action)
+                fastState = fastState.generateSuccessor(agentIndex, action)
+                agentIndex = (agentIndex + 1) % state.getNumAgents()
+                move += 1
+            moves += move
+    return moves, mismatches
+
+
+if __name__ == '__main__':
+    from optparse import OptionParser
+    parser = OptionParser('python benchmark.py <options>')
+    parser.add_option('-l', '--layout', dest='layout', default='originalClassic',
+                      help='the LAYOUT_FILE to benchmark on [Default: %default]',
+                      metavar='LAYOUT_FILE')
+    parser.add_option('-n', '--numStates', dest='numStates', type='int', default=20000,
+                      help='how many states to keep alive [Default: %default]')
+    parser.add_option('-s', '--search', action='store_true', dest='search', default=False,
+                      help='count the states AlphaBetaAgent generates on the q3 tests instead')
+    parser.add_option('-c', '--checkRules', action='store_true', dest='checkRules', default=False,
+                      help='compare FastGameState with GameState on random games of'
+                      ' the comma-separated LAYOUT_FILEs instead')
+    parser.add_option('-g', '--numGames', dest='numGames', type='int', default=20,
+                      help='how many games to play per layout with --checkRules [Default: %default]')
+    parser.add_option('-a', '--agentArgs', action='append', dest='agentArgs', default=[],
+                      help='AlphaBetaAgent arguments to compare, e.g. "engine=pvs";'
+                      ' repeat for each setting [Default: plain alpha-beta]')
+    options, otherjunk = parser.parse_args(sys.argv[1:])
+    if len(otherjunk) != 0:
+        raise Exception('Command line input not understood: ' + str(otherjunk))
+
+    if options.checkRules:
+        moves, mismatches = checkRules(options.layout.split(','), options.numGames)
+        for layoutName, game, move in mismatches:
+            print('%s game %d: the states disagree after move %d' % (layoutName, game, move))
+        print('%d moves, %d games with mismatches' % (moves, len(mismatches)))
+        if mismatches:
+            sys.exit(1)
+    elif options.search:
+        settings = options.agentArgs or ['']
+        results = [searchNodes(parseAgentArgs(a or None)) for a in settings]
+        labels = [a or 'alphabeta' for a in settings]
+        widths = [max(len(label), 8) + 2 for label in labels]
+        print('%-30s' % 'test' + ''.join('%*s' % (w, label) for w, label in zip(widths, labels)))
+        for row in zip(*results):
+            print('%-30s' % row[0][0] + ''.join('%*d' % (w, n) for w, (name, n) in zip(widths, row)))
+        print('%-30s' % 'total' + ''.join('%*d' % (w, sum(n for name, n in r))
+                                         for w, r in zip(widths, results)))
+    else:
+        print('%s: %.0f bytes per GameState' %
+              (options.layout, stateMemory(options.layout, options.numStates)))
@@ -25,6 +25,7 @@ import time
 import os
 import traceback
 import sys
+import random
 
 #######################
 # Parts worth reading #
@@ -79,29 +80,61 @@ class Configuration:
 
     The convention for positions, like a graph, is that (0,0) is the lower left corner, x increases
     horizontally and y increases vertically.  Therefore, north is the direction of increasing y, or (0,1).
+
+    Agents move in steps of half a cell (scared ghosts move at half speed), so
+    the position is stored exactly as integer half-cell units in halfPos.  The
+    pos attribute and getPosition() give the position in cells: ints on grid
+    points and floats in between.
     """
+    __slots__ = ('halfPos', 'direction')
 
     def __init__(self, pos, direction):
-        self.pos = pos
+        x, y = pos
+        self.halfPos = (int(2 * x), int(2 * y))
         self.direction = direction
 
+    def fromHalfPosition(halfPos, direction):
+        """
+        Creates a configuration directly from a position in half cells.
+        """
+        conf = Configuration.__new__(Configuration)
+        conf.halfPos = halfPos
+        conf.direction = direction
+        return conf
+    fromHalfPosition = staticmethod(fromHalfPosition)
+
     def getPosition(self):
-        return (self.pos)
+        x, y = self.halfPos
+        return (x / 2.0 if x & 1 else x >> 1, y / 2.0 if y & 1 else y >> 1)
+
+    def _setPosition(self, pos):
+        x, y = pos
+        self.halfPos = (int(2 * x), int(2 * y))
+
+    pos = property(getPosition, _setPosition)
 
     def getDirection(self):
         return self.direction
 
     def isInteger(self):
-        x, y = self.pos
-        return x == int(x) and y == int(y)
+        x, y = self.halfPos
+        return not (x | y) & 1
+
+    def getNearestPoint(self):
+        """
+        Returns the grid point nearest to this configuration, as
+        util.nearestPoint does for a position.
+        """
+        x, y = self.halfPos
+        return ((x + 1) >> 1, (y + 1) >> 1)
 
     def __eq__(self, other):
         if other == None:
             return False
-        return (self.pos == other.pos and self.direction == other.direction)
+        return (self.halfPos == other.halfPos and self.direction == other.direction)
 
     def __hash__(self):
-        x = hash(self.pos)
+        x = hash(self.halfPos)
         y = hash(self.direction)
         return hash(x + 13 * y)
 
@@ -116,27 +149,42 @@ class Configuration:
 
         Actions are movement vectors.
         """
-        x, y = self.pos
+        x, y = self.halfPos
         dx, dy = vector
         direction = Actions.vectorToDirection(vector)
         if direction == Directions.STOP:
             direction = self.direction  # There is no stop direction
-        return Configuration((x + dx, y+dy), direction)
+        return Configuration.fromHalfPosition((x + int(2 * dx), y + int(2 * dy)), direction)
+
+    def generateHalfStepSuccessor(self, action, halfSteps):
+        """
+        Like generateSuccessor, but moves halfSteps half cells in the direction
+        of the action using integer arithmetic only.
+        """
+        dx, dy = Actions._directions[action]
+        x, y = self.halfPos
+        if action == Directions.STOP:
+            direction = self.direction  # There is no stop direction
+        else:
+            direction = action
+        return Configuration.fromHalfPosition((x + dx * halfSteps, y + dy * halfSteps), direction)
 
 
 class AgentState:
     """
     AgentStates hold the state of an agent (configuration, speed, scared, etc).
     """
+    __slots__ = ('start', 'configuration', 'isPacman', 'scaredTimer')
+
+    # state below potentially used for contest only; always zero in classic Pacman
+    numCarrying = 0
+    numReturned = 0
 
     def __init__(self, startConfiguration, isPacman):
         self.start = startConfiguration
         self.configuration = startConfiguration
         self.isPacman = isPacman
         self.scaredTimer = 0
-        # state below potentially used for contest only
-        self.numCarrying = 0
-        self.numReturned = 0
 
     def __str__(self):
         if self.isPacman:
@@ -156,8 +204,6 @@ class AgentState:
         state = AgentState(self.start, self.isPacman)
         state.configuration = self.configuration
         state.scaredTimer = self.scaredTimer
-        state.numCarrying = self.numCarrying
-        state.numReturned = self.numReturned
         return state
 
     def getPosition(self):
@@ -177,11 +223,13 @@ class Grid:
 
     The __str__ method constructs an output that is oriented like a pacman board.
     """
+    __slots__ = ('width', 'height', 'data')
+
+    CELLS_PER_INT = 30
 
     def __init__(self, width, height, initialValue=False, bitRepresentation=None):
         if initialValue not in [False, True]:
             raise Exception('Grids can only contain booleans')
-        self.CELLS_PER_INT = 30
 
         self.width = width
         self.height = height
@@ -231,6 +279,12 @@ class Grid:
         g.data = self.data
         return g
 
+    def readOnly(self):
+        """
+        Returns a read-only copy of this grid, to share between game states.
+        """
+        return ReadOnlyGrid(self)
+
     def count(self, item=True):
         return sum([x.count(item) for x in self.data])
 
@@ -262,7 +316,7 @@ class Grid:
         return tuple(bits)
 
     def _cellIndexToPosition(self, index):
-        x = index / self.height
+        x = index // self.height
         y = index % self.height
         return x, y
 
@@ -293,6 +347,226 @@ class Grid:
         return bools
 
 
+try:
+    _popcount = int.bit_count
+except AttributeError:
+    def _popcount(n):
+        return bin(n).count('1')
+
+
+class BitGrid(Grid):
+    """
+    A Grid of booleans backed by a single arbitrary-precision integer.  Cell
+    (x,y) is bit x * height + y, so a column occupies a contiguous run of bits.
+
+    Reads and writes still go through grid[x][y].  Because the bitmask is an
+    immutable int, copy() is O(1), count() is a popcount and hashing and
+    equality compare a single int instead of walking every cell.
+    """
+    __slots__ = ('bits',)
+
+    # Cleared by ReadOnlyBitGrid, whose columns refuse writes
+    writable = True
+
+    def __init__(self, width, height, initialValue=False, bitRepresentation=None):
+        if initialValue not in [False, True]:
+            raise Exception('Grids can only contain booleans')
+
+        self.width = width
+        self.height = height
+        if initialValue:
+            self.bits = (1 << (width * height)) - 1
+        else:
+            self.bits = 0
+        if bitRepresentation:
+            self._unpackBits(bitRepresentation)
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.width
+        if i < 0 or i >= self.width:
+            raise IndexError('BitGrid column index out of range')
+        return _BitGridColumn(self, i)
+
+    def __setitem__(self, key, item):
+        column = _BitGridColumn(self, key)
+        for y in range(self.height):
+            column[y] = item[y]
+
+    def __len__(self):
+        return self.width
+
+    def __iter__(self):
+        for x in range(self.width):
+            yield _BitGridColumn(self, x)
+
+    def __str__(self):
+        out = [[str(self[x][y])[0] for x in range(self.width)]
+               for y in range(self.height)]
+        out.reverse()
+        return '\n'.join([''.join(x) for x in out])
+
+    def __eq__(self, other):
+        if other == None:
+            return False
+        if isinstance(other, BitGrid):
+            return self.bits == other.bits and self.width == other.width \
+                and self.height == other.height
+        return self.width == other.width and self.height == other.height \
+            and self.asList() == other.asList()
+
+    def __hash__(self):
+        return hash(self.bits)
+
+    def copy(self):
+        g = BitGrid.__new__(BitGrid)
+        g.width = self.width
+        g.height = self.height
+        g.bits = self.bits
+        return g
+
+    def deepCopy(self):
+        return self.copy()
+
+    def shallowCopy(self):
+        # The bitmask is immutable, so a shallow copy is already independent
+        return self.copy()
+
+    def readOnly(self):
+        g = ReadOnlyBitGrid.__new__(ReadOnlyBitGrid)
+        g.width = self.width
+        g.height = self.height
+        g.bits = self.bits
+        return g
+
+    def count(self, item=True):
+        numSet = _popcount(self.bits)
+        if item:
+            return numSet
+        return self.width * self.height - numSet
+
+    def asList(self, key=True):
+        if not key:
+            return Grid.asList(self, key)
+        list = []
+        bits = self.bits
+        height = self.height
+        while bits:
+            low = bits & -bits
+            list.append(divmod(low.bit_length() - 1, height))
+            bits ^= low
+        return list
+
+    def isSet(self, x, y):
+        """
+        Reads a single cell without building a column view.
+        """
+        return (self.bits >> (x * self.height + y)) & 1 == 1
+
+    def unset(self, x, y):
+        """
+        Clears a single cell without building a column view.
+        """
+        if not self.writable:
+            raise TypeError('read-only grids cannot be written')
+        self.bits &= ~(1 << (x * self.height + y))
+
+
+class _BitGridColumn:
+    """
+    A view of one column of a BitGrid, so that grid[x][y] reads and writes
+    the underlying bitmask.
+    """
+    __slots__ = ('grid', 'offset')
+
+    def __init__(self, grid, x):
+        self.grid = grid
+        self.offset = x * grid.height
+
+    def __getitem__(self, y):
+        if y < 0:
+            y += self.grid.height
+        if y < 0 or y >= self.grid.height:
+            raise IndexError('BitGrid row index out of range')
+        return (self.grid.bits >> (self.offset + y)) & 1 == 1
+
+    def __setitem__(self, y, value):
+        if not self.grid.writable:
+            raise TypeError('read-only grids cannot be written')
+        if value not in [False, True]:
+            raise Exception('Grids can only contain booleans')
+        if y < 0:
+            y += self.grid.height
+        if y < 0 or y >= self.grid.height:
+            raise IndexError('BitGrid row index out of range')
+        bit = 1 << (self.offset + y)
+        if value:
+            self.grid.bits |= bit
+        else:
+            self.grid.bits &= ~bit
+
+    def __len__(self):
+        return self.grid.height
+
+    def __iter__(self):
+        bits = self.grid.bits >> self.offset
+        for y in range(self.grid.height):
+            yield (bits >> y) & 1 == 1
+
+
+class ReadOnlyGrid(Grid):
+    """
+    A Grid that cannot be written, for grids that every state of a game
+    shares, such as a layout's walls.  Its columns are tuples, so reads are
+    as fast as a Grid's and writes raise TypeError.  copy() returns an
+    ordinary Grid.
+    """
+    __slots__ = ()
+
+    def __init__(self, grid):
+        self.width = grid.width
+        self.height = grid.height
+        self.data = [tuple(column) for column in grid.data]
+
+    def __setitem__(self, key, item):
+        raise TypeError('read-only grids cannot be written')
+
+    def __eq__(self, other):
+        if other == None:
+            return False
+        return [list(x) for x in self.data] == [list(x) for x in other.data]
+
+    __hash__ = Grid.__hash__
+
+    def copy(self):
+        g = Grid(self.width, self.height)
+        g.data = [list(x) for x in self.data]
+        return g
+
+    def deepCopy(self):
+        return self.copy()
+
+    def readOnly(self):
+        return self
+
+
+class ReadOnlyBitGrid(BitGrid):
+    """
+    A BitGrid that cannot be written, for grids that every state of a game
+    shares, such as a layout's food.  Writes raise TypeError; copy() returns
+    an ordinary BitGrid.
+    """
+    __slots__ = ()
+
+    writable = False
+
+    def __setitem__(self, key, item):
+        raise TypeError('read-only grids cannot be written')
+
+    def readOnly(self):
+        return self
+
+
 def reconstituteGrid(bitRep):
     if type(bitRep) is not type((1, 2)):
         return bitRep
@@ -351,12 +625,12 @@ class Actions:
 
     def getPossibleActions(config, walls):
         possible = []
-        x, y = config.pos
-        x_int, y_int = int(x + 0.5), int(y + 0.5)
+        x, y = config.halfPos
 
         # In between grid points, all agents must continue straight
-        if (abs(x - x_int) + abs(y - y_int) > Actions.TOLERANCE):
+        if (x | y) & 1:
             return [config.getDirection()]
+        x_int, y_int = x >> 1, y >> 1
 
         for dir, vec in Actions._directionsAsList:
             dx, dy = vec
@@ -393,19 +667,107 @@ class Actions:
     getSuccessor = staticmethod(getSuccessor)
 
 
+ZOBRIST_KEY_CACHE = {}
+
+
+class ZobristKeys:
+    """
+    Random bit strings for Zobrist hashing of game states on a board of a
+    given size.  A state's hash is the xor of the keys of every agent's
+    position, direction and scared timer, every remaining food pellet and
+    every remaining capsule, so a successor's hash can be derived from its
+    parent's by xoring out the old keys and xoring in the new ones.
+
+    Keys only depend on the board dimensions and the number of agents, so
+    equal states always hash equally even when their layouts are copies.
+    """
+
+    def __init__(self, width, height, numAgents):
+        # A private generator keeps the game's random sequence untouched
+        rng = random.Random('zobrist-%d-%d-%d' % (width, height, numAgents))
+        self.height = height
+        numCells = width * height
+        self.food = [rng.getrandbits(64) for i in range(numCells)]
+        self.capsules = [rng.getrandbits(64) for i in range(numCells)]
+        # Positions are indexed in half cells so scared ghosts hash exactly
+        self.positions = [[rng.getrandbits(64) for i in range(4 * numCells)]
+                          for agent in range(numAgents)]
+        self.directions = [dict([(direction, rng.getrandbits(64)) for direction in
+                                 [Directions.NORTH, Directions.SOUTH, Directions.EAST,
+                                  Directions.WEST, Directions.STOP]])
+                           for agent in range(numAgents)]
+        self.scaredTimers = [[0] for agent in range(numAgents)]
+
+    def getKeys(layout, numAgents):
+        """
+        Returns the shared key table for a layout with numAgents agents.
+        """
+        cacheKey = (layout.width, layout.height, numAgents)
+        keys = ZOBRIST_KEY_CACHE.get(cacheKey)
+        if keys is None:
+            keys = ZobristKeys(layout.width, layout.height, numAgents)
+            ZOBRIST_KEY_CACHE[cacheKey] = keys
+        return keys
+    getKeys = staticmethod(getKeys)
+
+    def agentKey(self, agentIndex, agentState):
+        conf = agentState.configuration
+        if conf == None:
+            return 0
+        x, y = conf.halfPos
+        timer = agentState.scaredTimer
+        timers = self.scaredTimers[agentIndex]
+        while timer >= len(timers):
+            # Timer keys are seeded individually so they do not depend on
+            # the order in which timers are first seen
+            timers.append(random.Random('zobrist-timer-%d-%d' % (
+                agentIndex, len(timers))).getrandbits(64))
+        return self.positions[agentIndex][x * 2 * self.height + y] ^ \
+            self.directions[agentIndex][conf.direction] ^ timers[timer]
+
+    def cellKey(self, table, position):
+        x, y = position
+        return table[x * self.height + y]
+
+    def stateKey(self, data):
+        """
+        Computes the hash of a GameStateData from scratch.
+        """
+        h = 0
+        for index, agentState in enumerate(data.agentStates):
+            h ^= self.agentKey(index, agentState)
+        for position in data.food.asList():
+            h ^= self.cellKey(self.food, position)
+        for position in data.capsules:
+            h ^= self.cellKey(self.capsules, position)
+        return h
+
+
 class GameStateData:
+    __slots__ = ('food', 'capsules', 'agentStates', 'layout', 'score', 'scoreChange',
+                 '_eaten', '_ownedAgents', '_foodEaten', '_foodAdded', '_capsuleEaten',
+                 '_agentMoved', '_lose', '_win', '_hash', '_numFood', '_foodList',
+                 '_ghostPositions')
 
     def __init__(self, prevState=None):
         """
         Generates a new data packet by copying information from its predecessor.
         """
-        if prevState != None:
-            self.food = prevState.food.shallowCopy()
-            self.capsules = prevState.capsules[:]
-            self.agentStates = self.copyAgentStates(prevState.agentStates)
+        if prevState is not None:
+            # Shared with the predecessor; PacmanRules.consume copies it before eating
+            self.food = prevState.food
+            # Replaced rather than mutated when a capsule is eaten
+            self.capsules = prevState.capsules
+            # Agent states are shared with the predecessor until written to;
+            # see getMutableAgentState
+            self.agentStates = prevState.agentStates[:]
+            self._ownedAgents = 0
             self.layout = prevState.layout
             self._eaten = prevState._eaten
             self.score = prevState.score
+            self._numFood = prevState._numFood
+            self._foodList = prevState._foodList
+            self._ghostPositions = prevState._ghostPositions
 
         self._foodEaten = None
         self._foodAdded = None
@@ -413,24 +775,159 @@ class GameStateData:
         self._agentMoved = None
         self._lose = False
         self._win = False
+        self._hash = None
         self.scoreChange = 0
 
     def deepCopy(self):
         state = GameStateData(self)
         state.food = self.food.deepCopy()
-        state.layout = self.layout.deepCopy()
+        state.capsules = self.capsules[:]
+        state.agentStates = self.copyAgentStates(self.agentStates)
+        state._ownedAgents = (1 << len(state.agentStates)) - 1
         state._agentMoved = self._agentMoved
         state._foodEaten = self._foodEaten
         state._foodAdded = self._foodAdded
         state._capsuleEaten = self._capsuleEaten
+        state._hash = self._hash
         return state
 
+    # Order in which directions are numbered in state keys
+    KEY_DIRECTIONS = [Directions.NORTH, Directions.SOUTH, Directions.EAST,
+                      Directions.WEST, Directions.STOP]
+    KEY_DIRECTION_INDEX = dict([(d, i) for i, d in enumerate(KEY_DIRECTIONS)])
+
+    def key(self):
+        """
+        Returns a compact, immutable and hashable encoding of this state:
+
+          (score, flags, foodBits, capsuleBits, x0, y0, dir0, timer0, x1, ...)
+
+        flags holds 1 for a win and 2 for a loss, foodBits has bit
+        x * height + y set for every remaining pellet, capsuleBits has bit i
+        set if layout.capsules[i] remains, and each agent contributes its
+        position in half cells, direction number and scared timer.
+        """
+        food = self.food
+        if isinstance(food, BitGrid):
+            foodBits = food.bits
+        else:
+            foodBits = 0
+            for x, y in food.asList():
+                foodBits |= 1 << (x * food.height + y)
+        capsuleBits = 0
+        for i, capsule in enumerate(self.layout.capsules):
+            if capsule in self.capsules:
+                capsuleBits |= 1 << i
+        key = [self.score, int(self._win) | (int(self._lose) << 1), foodBits, capsuleBits]
+        directionIndex = GameStateData.KEY_DIRECTION_INDEX
+        for agentState in self.agentStates:
+            conf = agentState.configuration
+            x, y = conf.halfPos
+            key.extend((x, y, directionIndex[conf.direction], agentState.scaredTimer))
+        return tuple(key)
+
+    def fromKey(layout, key):
+        """
+        Rebuilds the GameStateData encoded by key() for the given layout.
+        """
+        numAgents = (len(key) - 4) // 4
+        data = GameStateData()
+        data.initialize(layout, numAgents - 1)
+        data.score = key[0]
+        data._win = bool(key[1] & 1)
+        data._lose = bool(key[1] & 2)
+        food = data.food.copy()
+        food.bits = key[2]
+        data.food = food
+        data._numFood = food.count()
+        data._foodList = tuple(food.asList())
+        data.capsules = [capsule for i, capsule in enumerate(layout.capsules)
+                         if (key[3] >> i) & 1]
+        for index in range(numAgents):
+            x, y, direction, timer = key[4 + 4 * index: 8 + 4 * index]
+            agentState = data.agentStates[index]
+            agentState.configuration = Configuration.fromHalfPosition(
+                (x, y), GameStateData.KEY_DIRECTIONS[direction])
+            agentState.scaredTimer = timer
+        return data
+    fromKey = staticmethod(fromKey)
+
+    def getFoodList(self):
+        """
+        Returns the positions of the remaining food as a tuple.  The tuple is
+        built once and then shared with successors until food is eaten.
+        """
+        if self._foodList is None:
+            self._foodList = tuple(self.food.asList())
+        return self._foodList
+
+    def getGhostPositions(self):
+        """
+        Returns the ghost positions as a tuple, rebuilt only after a ghost
+        has moved.
+        """
+        if self._ghostPositions is None:
+            self._ghostPositions = tuple([s.getPosition() for s in self.agentStates[1:]])
+        return self._ghostPositions
+
+    def getZobristKeys(self):
+        return ZobristKeys.getKeys(self.layout, len(self.agentStates))
+
+    def updateHash(self, prevState):
+        """
+        Derives this state's hash from its predecessor's by xoring in only
+        what changed: agents whose configuration or scared timer differ, and
+        the food and capsule eaten this turn.  A predecessor that was never
+        hashed is hashed from scratch first, once per search root.
+        """
+        h = prevState._hash
+        if h is None:
+            h = prevState._hash = prevState.getZobristKeys().stateKey(prevState)
+        self.deriveHash(h, prevState.agentStates)
+
+    def deriveHash(self, h, prevAgentStates):
+        """
+        Sets this state's hash from the hash h and the agent states of the
+        state it was reached from in one move.
+        """
+        keys = None
+        agentStates = self.agentStates
+        for index, old in enumerate(prevAgentStates):
+            new = agentStates[index]
+            if old is new:
+                continue
+            if old.configuration is not new.configuration or old.scaredTimer != new.scaredTimer:
+                if keys is None:
+                    keys = self.getZobristKeys()
+                h ^= keys.agentKey(index, old) ^ keys.agentKey(index, new)
+        if self._foodEaten != None or self._capsuleEaten != None:
+            if keys is None:
+                keys = self.getZobristKeys()
+            if self._foodEaten != None:
+                h ^= keys.cellKey(keys.food, self._foodEaten)
+            if self._capsuleEaten != None:
+                h ^= keys.cellKey(keys.capsules, self._capsuleEaten)
+        self._hash = h
+
     def copyAgentStates(self, agentStates):
         copiedStates = []
         for agentState in agentStates:
             copiedStates.append(agentState.copy())
         return copiedStates
 
+    def getMutableAgentState(self, agentIndex):
+        """
+        Returns the AgentState of the given agent for modification.
+
+        Successors share unchanged AgentStates with their predecessor, so the
+        first write to an agent in a new state copies its AgentState.  Rules
+        code must fetch agents through here before changing them.
+        """
+        if not (self._ownedAgents >> agentIndex) & 1:
+            self.agentStates[agentIndex] = self.agentStates[agentIndex].copy()
+            self._ownedAgents |= 1 << agentIndex
+        return self.agentStates[agentIndex]
+
     def __eq__(self, other):
         """
         Allows two states to be compared.
@@ -451,14 +948,13 @@ class GameStateData:
     def __hash__(self):
         """
         Allows states to be keys of dictionaries.
+
+        Uses the Zobrist hash kept up to date by updateHash, computing it
+        from scratch only for states whose predecessor was never hashed.
         """
-        for i, state in enumerate(self.agentStates):
-            try:
-                int(hash(state))
-            except TypeError as e:
-                print(e)
-                # hash(state)
-        return int((hash(tuple(self.agentStates)) + 13*hash(self.food) + 113 * hash(tuple(self.capsules)) + 7 * hash(self.score)) % 1048575)
+        if self._hash is None:
+            self._hash = self.getZobristKeys().stateKey(self)
+        return self._hash ^ hash(self.score)
 
     def __str__(self):
         width, height = self.layout.width, self.layout.height
@@ -475,7 +971,7 @@ class GameStateData:
                 continue
             if agentState.configuration == None:
                 continue
-            x, y = [int(i) for i in nearestPoint(agentState.configuration.pos)]
+            x, y = agentState.configuration.getNearestPoint()
             agent_dir = agentState.configuration.direction
             if agentState.isPacman:
                 map[x][y] = self._pacStr(agent_dir)
@@ -520,7 +1016,7 @@ class GameStateData:
         """
         self.food = layout.food.copy()
         #self.capsules = []
-        self.capsules = layout.capsules[:]
+        self.capsules = list(layout.capsules)
         self.layout = layout
         self.score = 0
         self.scoreChange = 0
@@ -536,6 +1032,13 @@ class GameStateData:
             self.agentStates.append(AgentState(
                 Configuration(pos, Directions.STOP), isPacman))
         self._eaten = [False for a in self.agentStates]
+        self._ownedAgents = (1 << len(self.agentStates)) - 1
+        self._hash = None
+        self._numFood = self.food.count()
+        # Built up front so that every later state shares it: successors
+        # copy it and PacmanRules.consume keeps it up to date
+        self._foodList = tuple(self.food.asList())
+        self._ghostPositions = None
 
 
 try:
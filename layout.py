@@ -14,6 +14,10 @@
 
 from util import manhattanDistance
 from game import Grid
+from game import BitGrid
+from game import Actions
+from game import Configuration
+from game import Directions
 import os
 import random
 from functools import reduce
@@ -24,24 +28,43 @@ VISIBILITY_MATRIX_CACHE = {}
 class Layout:
     """
     A Layout manages the static information about the game board.
+
+    A Layout is read-only once it has been built, since every state of a
+    game shares the same one: its walls and food are read-only grids, whose
+    writes raise TypeError, and its capsules and agent positions are tuples.
+    Game states keep their own copies of the food and capsules.
     """
 
     def __init__(self, layoutText):
         self.width = len(layoutText[0])
         self.height = len(layoutText)
+        # Walls are only ever read, and list reads are faster than bit tests
         self.walls = Grid(self.width, self.height, False)
-        self.food = Grid(self.width, self.height, False)
+        self.food = BitGrid(self.width, self.height, False)
         self.capsules = []
         self.agentPositions = []
         self.numGhosts = 0
         self.processLayoutText(layoutText)
+        self.walls = self.walls.readOnly()
+        self.food = self.food.readOnly()
+        self.capsules = tuple(self.capsules)
+        self.agentPositions = tuple(self.agentPositions)
         self.layoutText = layoutText
-        self.totalFood = len(self.food.asList())
+        self.totalFood = self.food.count()
+        self._legalActionTable = None
         # self.initializeVisibilityMatrix()
 
     def getNumGhosts(self):
         return self.numGhosts
 
+    def getLegalActionTable(self):
+        """
+        Returns the LegalActionTable for this maze, building it on first use.
+        """
+        if self._legalActionTable is None:
+            self._legalActionTable = LegalActionTable(self.walls)
+        return self._legalActionTable
+
     def initializeVisibilityMatrix(self):
         global VISIBILITY_MATRIX_CACHE
         if reduce(str.__add__, self.layoutText) not in VISIBILITY_MATRIX_CACHE:
@@ -97,7 +120,8 @@ class Layout:
         return "\n".join(self.layoutText)
 
     def deepCopy(self):
-        return Layout(self.layoutText[:])
+        # Layouts are never modified, so copies can share this one
+        return self
 
     def processLayoutText(self, layoutText):
         """
@@ -137,6 +161,68 @@ class Layout:
             self.numGhosts += 1
 
 
+class LegalActionTable:
+    """
+    Precomputed legal moves for every open cell of a maze, indexed by the
+    cell number x * height + y.  Pacman's moves only depend on the cell; a
+    ghost's also depend on its current direction, since ghosts cannot stop
+    or turn around unless they reach a dead end.
+    """
+
+    def __init__(self, walls):
+        self.height = walls.height
+        self.pacmanActions = []
+        self.ghostActions = []
+        directions = [Directions.NORTH, Directions.SOUTH, Directions.EAST,
+                      Directions.WEST, Directions.STOP]
+        for x in range(walls.width):
+            for y in range(walls.height):
+                if walls[x][y]:
+                    self.pacmanActions.append(None)
+                    self.ghostActions.append(None)
+                    continue
+                try:
+                    possible = Actions.getPossibleActions(
+                        Configuration((x, y), Directions.STOP), walls)
+                except IndexError:
+                    # Open cell on the edge of the board; left to the rules
+                    self.pacmanActions.append(None)
+                    self.ghostActions.append(None)
+                    continue
+                self.pacmanActions.append(tuple(possible))
+                ghost = {}
+                for direction in directions:
+                    legal = [a for a in possible if a != Directions.STOP]
+                    reverse = Actions.reverseDirection(direction)
+                    if reverse in legal and len(legal) > 1:
+                        legal.remove(reverse)
+                    ghost[direction] = tuple(legal)
+                self.ghostActions.append(ghost)
+
+    def getPacmanActions(self, config):
+        """
+        Returns Pacman's legal actions as a tuple, or None if the
+        configuration is not on a grid point covered by the table.
+        """
+        x, y = config.halfPos
+        if (x | y) & 1:
+            return None
+        return self.pacmanActions[(x >> 1) * self.height + (y >> 1)]
+
+    def getGhostActions(self, config):
+        """
+        Returns a ghost's legal actions as a tuple, or None if the
+        configuration is not on a grid point covered by the table.
+        """
+        x, y = config.halfPos
+        if (x | y) & 1:
+            return None
+        actions = self.ghostActions[(x >> 1) * self.height + (y >> 1)]
+        if actions is None:
+            return None
+        return actions[config.direction]
+
+
 def getLayout(name, back=2):
     if name.endswith('.lay'):
         layout = tryToLoad('layouts/' + name)
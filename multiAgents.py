@@ -14,9 +14,20 @@
 # Pieter Abbeel (pabbeel@cs.berkeley.edu).
 
 
-import random, util
+import random, util, time, math
+from util import manhattanDistance
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait
 
 from game import Agent
+from game import Actions
+from game import Directions
+from ghostAgents import RandomGhost, DirectionalGhost
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 class ReflexAgent(Agent):
@@ -88,6 +99,64 @@ def scoreEvaluationFunction(currentGameState):
     return currentGameState.getScore()
 
 
+def reachable(gameState, plies):
+    """
+    Returns how much food and how many capsules Pacman can eat in plies
+    more moves from gameState, and each ghost's distance from him.  Pacman
+    and the ghosts move at most a step each a move, so a ghost can only
+    touch him if it is within 2 * plies + 1 of him.
+    """
+    pacmanPosition = gameState.getPacmanPosition()
+    food = len([f for f in gameState.data.getFoodList()
+                if manhattanDistance(pacmanPosition, f) <= plies])
+    capsules = len([c for c in gameState.getCapsules()
+                    if manhattanDistance(pacmanPosition, c) <= plies])
+    distances = [manhattanDistance(pacmanPosition, position)
+                 for position in gameState.getGhostPositions()]
+    return min(food, plies), min(capsules, plies), distances
+
+
+def scoreBounds(gameState, plies):
+    """
+    Returns the lowest and highest score of any state reachable from
+    gameState in which Pacman has moved at most plies more times.  Pacman
+    loses a point a move and 500 for each ghost that catches him (several
+    can at once); he gains at most 10 a food, 500 for winning and 200 a
+    ghost eaten, and a ghost can only be eaten once while it is scared and
+    once more for each capsule eaten.
+    """
+    score = gameState.getScore()
+    food, capsules, distances = reachable(gameState, plies)
+    high = score + 10 * food
+    if food == gameState.getNumFood():
+        high += 500
+    low = score - plies
+    for ghostState, distance in zip(gameState.getGhostStates(), distances):
+        if distance <= 2 * plies + 1:
+            high += 200 * (capsules + (ghostState.scaredTimer > 0))
+            low -= 500
+    return low, high
+
+
+scoreEvaluationFunction.valueBounds = scoreBounds
+
+
+class SearchAborted(Exception):
+    """
+    Raised inside a search when it runs out of budget, to unwind back to the
+    root.  The result of the last completed iteration is used instead.
+    """
+    pass
+
+
+def parseFlag(value):
+    """
+    Reads a true/false agent argument.  Arguments come from the command line
+    as strings, and a bare "-a name" passes 1.
+    """
+    return str(value).lower() in ('1', 'true', 'yes', 'on')
+
+
 class MultiAgentSearchAgent(Agent):
     """
     This class provides some common elements to all of your
@@ -101,19 +170,361 @@ class MultiAgentSearchAgent(Agent):
     Note: this is an abstract class: one that should not be instantiated.  It's
     only partially specified, and designed to be extended.  Agent (game.py)
     is another abstract class.
+
+    Passing tt=N with -a gives the agent a TranspositionTable of N entries
+    (ttPolicy=lru or depth); its statistics are printed when a game ends.
+
+    Passing time=T gives each move a budget of T seconds.  The agent then
+    searches one level deeper at a time, up to self.depth, and plays the
+    move of the deepest level it finished in time.  Keep T below the game's
+    move timeout (see ClassicGameRules.getMoveTimeout).
+
+    If the evaluation function has an evaluateBatch(states) attribute, which
+    returns the values of a list of states, the last level of the search is
+    expanded in one go (see expandTree) and all of its leaves are evaluated
+    with one call to it.  Pass batch=False to evaluate them one at a time.
+
+    Passing bestReply=True switches to best-reply search: instead of each
+    ghost replying in turn, a ghost node offers the moves of every ghost
+    close enough to reach Pacman before the search ends, and only the
+    chosen ghost moves before Pacman's next turn.  If no ghost is that
+    close, the ghosts pass.  A level then costs Pacman's moves times the
+    sum of the nearby ghosts' moves rather than the product of all of them,
+    so the search gets much deeper with several ghosts, at the price of
+    ghosts that do not all move every turn.  Expectimax averages over
+    these moves uniformly: every (ghost, action) pair is equally likely, so
+    a ghost with more legal moves is more likely to be the one that moves.
+
+    Passing fast=True searches on pacman.FastGameStates: the root is turned
+    into a flat state and successors are generated by pacman.FastRules,
+    which plays the same game without copying GameStateData.  Evaluation
+    functions then get FastGameStates, which only have the GameState
+    methods search and evaluation use.
     """
 
-    def __init__(self, evalFn='scoreEvaluationFunction', depth='2'):
+    # The kind of node a ghost's move is in expandTree trees
+    ghostNode = 'min'
+
+    # How many states are generated between looks at the clock
+    TIME_CHECK_INTERVAL = 128
+
+    def __init__(self, evalFn='scoreEvaluationFunction', depth='2', tt='0', ttPolicy='lru',
+                 time='0', batch='True', bestReply='False', fast='False'):
         self.index = 0  # Pacman is always agent index 0
         self.evaluationFunction = util.lookup(evalFn, globals())
         self.depth = int(depth)
+        self.evaluateBatch = None
+        if parseFlag(batch):
+            self.evaluateBatch = getattr(self.evaluationFunction, 'evaluateBatch', None)
+        # Transposition table, off unless a size is given with -a tt=N
+        self.table = None
+        if int(tt) > 0:
+            self.table = TranspositionTable(int(tt), ttPolicy)
+        self.tableLayout = None
+        self.timeLimit = float(time)
+        self.bestReply = parseFlag(bestReply)
+        self.fast = parseFlag(fast)
+        self.iterative = False
+        self.nodeLimit = 0
+        self.nodes = 0
+        self.deadline = None
+        self.canAbort = False
+        self.searchDepth = self.depth
+
+    def deepen(self, gameState, search):
+        """
+        Returns search(gameState) with self.searchDepth set to self.depth,
+        on a FastGameState of it if the agent is fast.
+
+        If the agent is iterative or has a time budget, search is run at
+        depth 1, 2, ... self.depth instead, and the result of the deepest
+        run that finished is returned.  A run is abandoned once the budget
+        is spent; the first one always finishes so there is a move to play.
+        """
+        self.nodes = 0
+        self.canAbort = False
+        self.deadline = None
+        if self.fast:
+            # Imported here so the agents do not load the engine themselves
+            from pacman import FastGameState
+            gameState = FastGameState.fromGameState(gameState)
+        if self.table is not None:
+            if not hasattr(gameState, 'key'):
+                raise Exception("The transposition table needs states with a key()")
+            if gameState.data.layout is not self.tableLayout:
+                self.table.clear()
+                self.tableLayout = gameState.data.layout
+            self.table.newGeneration()
+        if self.timeLimit > 0:
+            self.deadline = time.time() + self.timeLimit
+        if not self.iterative and self.deadline is None:
+            self.searchDepth = self.depth
+            return search(gameState)
+
+        result = None
+        for depth in range(1, self.depth + 1):
+            self.searchDepth = depth
+            self.canAbort = result is not None
+            try:
+                result = search(gameState)
+            except SearchAborted:
+                break
+        return result
+
+    def successor(self, gameState, agentIndex, action):
+        """
+        Generates a successor for the search, counting it against the budget.
+        """
+        self.nodes += 1
+        if self.canAbort:
+            if self.nodeLimit and self.nodes > self.nodeLimit:
+                raise SearchAborted()
+            if (self.deadline is not None and self.nodes % self.TIME_CHECK_INTERVAL == 0
+                    and time.time() > self.deadline):
+                raise SearchAborted()
+        return gameState.generateSuccessorUnchecked(agentIndex, action)
+
+    def children(self, gameState, moves, agentIndex=None):
+        """
+        Yields (move, successor) for each of moves in order, where moves are
+        actions of agent agentIndex or, if it is None, (agentIndex, action)
+        pairs as ghostMoves gives them.  A successor is only generated when
+        the loop over them gets to it, so only one sibling is alive at a
+        time and a search that cuts off never builds the rest.
+        """
+        if agentIndex is None:
+            for move in moves:
+                yield move, self.successor(gameState, move[0], move[1])
+        else:
+            for action in moves:
+                yield action, self.successor(gameState, agentIndex, action)
+
+    def ghostMoves(self, gameState, agentIndex, depthSoFar):
+        """
+        Returns the (ghostIndex, action) moves at a ghost node where agent
+        agentIndex is to move, and the agent and depth the search continues
+        with after them.  With bestReply the list is empty if the ghosts pass.
+        """
+        numAgents = gameState.getNumAgents()
+        if self.bestReply:
+            # Pacman and a ghost each move once per level left
+            reach = 2 * (self.searchDepth - depthSoFar)
+            pacmanPosition = gameState.getPacmanPosition()
+            moves = [(ghostIndex, action) for ghostIndex in range(1, numAgents)
+                     if manhattanDistance(gameState.getGhostPosition(ghostIndex), pacmanPosition) <= reach
+                     for action in gameState.getLegalActions(ghostIndex)]
+            return moves, 0, depthSoFar + 1
+        moves = [(agentIndex, action) for action in gameState.getLegalActions(agentIndex)]
+        if agentIndex + 1 == numAgents:  # all the ghost(s) finished their turn, Pacman next
+            return moves, 0, depthSoFar + 1
+        return moves, agentIndex + 1, depthSoFar  # Another ghost's turn
+
+    def expandTree(self, gameState, agentIndex, depthSoFar, plies, tasks, leaves):
+        """
+        Expands the search tree below gameState, up to plies more moves, and
+        returns it as nested (kind, children) tuples, where kind is 'max' for
+        Pacman's moves and ghostNode for the ghosts'.  Leaves of the search
+        are added to leaves and appear as ('leaf', index); the states where
+        the plies run out are added to tasks as (key, agentIndex, depthSoFar)
+        and appear as ('task', index).
+        """
+        if depthSoFar == self.searchDepth or gameState.isWin() or gameState.isLose():
+            leaves.append(gameState)
+            return ('leaf', len(leaves) - 1)
+        if plies == 0:
+            tasks.append((gameState.key(), agentIndex, depthSoFar))
+            return ('task', len(tasks) - 1)
+        if agentIndex == 0:
+            children = [self.expandTree(self.successor(gameState, 0, action),
+                                        1, depthSoFar, plies - 1, tasks, leaves)
+                        for action in gameState.getLegalActions(0)]
+            return ('max', children)
+        moves, nextAgent, nextDepth = self.ghostMoves(gameState, agentIndex, depthSoFar)
+        if not moves:
+            return self.expandTree(gameState, nextAgent, nextDepth, plies - 1, tasks, leaves)
+        children = [self.expandTree(self.successor(gameState, ghostIndex, action),
+                                    nextAgent, nextDepth, plies - 1, tasks, leaves)
+                    for ghostIndex, action in moves]
+        return (self.ghostNode, children)
+
+    def combine(self, tree, leafValues, taskValues=()):
+        """
+        Returns the value of a tree from expandTree, given the values of its
+        leaves and tasks.
+        """
+        kind, contents = tree
+        if kind == 'leaf':
+            return leafValues[contents]
+        if kind == 'task':
+            return taskValues[contents]
+        childValues = [self.combine(child, leafValues, taskValues) for child in contents]
+        if kind == 'max':
+            return max(childValues)
+        if kind == 'min':
+            return min(childValues)
+        return sum(childValues) / len(childValues)
+
+    def evaluateLeaves(self, states):
+        if self.evaluateBatch is not None:
+            return self.evaluateBatch(states)
+        return [self.evaluationFunction(state) for state in states]
+
+    def batchValue(self, gameState, agentIndex, depthSoFar):
+        """
+        Returns the value of gameState when the search ends within this
+        level, expanding the rest of it and evaluating its leaves together.
+        """
+        leaves = []
+        tree = self.expandTree(gameState, agentIndex, depthSoFar, -1, [], leaves)
+        return self.combine(tree, self.evaluateLeaves(leaves))
+
+    def pliesLeft(self, gameState, agentIndex, depthSoFar):
+        """
+        Returns how many more moves the search makes below a node.
+        """
+        return (self.searchDepth - depthSoFar) * gameState.getNumAgents() - agentIndex
+
+    def final(self, state):
+        if self.table is not None:
+            print(self.table.statsString())
+
+
+class TranspositionTable:
+    """
+    Remembers the values of positions already searched, keyed by the state's
+    key() and the agent to move.  Keys are full state encodings rather than
+    hashes, so a hit is always the same position; they do not encode the
+    walls, so agents clear the table when the layout changes.  Each entry records how many moves were
+    searched below the position, so a result is only reused for a search at
+    most that deep, and whether the value is exact or only a bound (from an
+    alpha-beta cutoff).
+
+    The table is kept from one move to the next: the positions searched
+    below the move that was played come up again in the next search, where
+    they give exact values to its first levels and good moves to try first
+    in the rest.  Each search is a new generation, and entries remember
+    the one that stored them.
+
+    The table holds at most maxEntries positions.  When it is full the least
+    recently used entry is evicted; with the 'depth' policy the oldest
+    generation's shallowest entry among the few least recently used ones is
+    evicted instead, and a deeper result of the current generation is never
+    overwritten by a shallower one.
+    """
+    EXACT = 0
+    LOWER = 1  # The value is at least this much
+    UPPER = 2  # The value is at most this much
+
+    # Number of least recently used entries the 'depth' policy chooses among
+    EVICTION_WINDOW = 4
+
+    def __init__(self, maxEntries, policy='lru'):
+        if policy not in ('lru', 'depth'):
+            raise Exception("Unknown transposition table policy: " + policy)
+        self.maxEntries = maxEntries
+        self.policy = policy
+        self.entries = OrderedDict()
+        self.generation = 0
+        self.resetStats()
+
+    def resetStats(self):
+        self.hits = 0
+        self.reuses = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def newGeneration(self):
+        """
+        Starts the generation of a new search.
+        """
+        self.generation += 1
+
+    def clear(self):
+        self.entries.clear()
+
+    def lookup(self, key, plies):
+        """
+        Returns the (plies, value, bound, move, generation) entry for key if
+        it was searched at least plies moves deep, and None otherwise.
+        """
+        entry = self.entries.get(key)
+        if entry is None or entry[0] < plies:
+            self.misses += 1
+            return None
+        self.hits += 1
+        if entry[4] != self.generation:
+            self.reuses += 1
+        self.entries.move_to_end(key)
+        return entry
+
+    def getMove(self, key):
+        """
+        Returns the best move stored for key at any depth, or None.
+        """
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        return entry[3]
+
+    def store(self, key, plies, value, bound, move):
+        entries = self.entries
+        old = entries.get(key)
+        if old is not None:
+            entries.move_to_end(key)
+            if self.policy == 'depth' and old[0] > plies and old[4] == self.generation:
+                return
+        self.stores += 1
+        entries[key] = (plies, value, bound, move, self.generation)
+        if len(entries) > self.maxEntries:
+            self.evict()
+
+    def evict(self):
+        entries = self.entries
+        if self.policy == 'lru':
+            entries.popitem(last=False)
+        else:
+            oldest = []
+            for key in entries:
+                entry = entries[key]
+                oldest.append((entry[4], entry[0], len(oldest), key))
+                if len(oldest) == self.EVICTION_WINDOW:
+                    break
+            del entries[min(oldest)[3]]
+        self.evictions += 1
+
+    def statsString(self):
+        probes = self.hits + self.misses
+        rate = 0.0
+        if probes > 0:
+            rate = 100.0 * self.hits / probes
+        return ("Transposition table: %d hits (%d from earlier moves), %d misses (%.1f%% hits), "
+                "%d stores, %d evictions, %d/%d entries") % (
+            self.hits, self.reuses, self.misses, rate, self.stores, self.evictions,
+            len(self.entries), self.maxEntries)
 
 
 class MinimaxAgent(MultiAgentSearchAgent):
     """
     Your minimax agent (question 2)
+
+    With workers=N (passed with -a) the subtrees one or two moves below the
+    root are searched in a pool of N processes, which lasts for as long as
+    the agent plays on the same layout.  States are sent to the workers as
+    their key() and rebuilt there; the workers do not share the agent's
+    transposition table.
     """
 
+    # Deepest split point; the root of the search is ply 0
+    MAX_SPLIT_PLIES = 2
+
+    def __init__(self, evalFn='scoreEvaluationFunction', depth='2', tt='0', ttPolicy='lru',
+                 time='0', batch='True', bestReply='False', workers='0', fast='False'):
+        MultiAgentSearchAgent.__init__(self, evalFn, depth, tt, ttPolicy, time, batch, bestReply, fast)
+        self.workers = int(workers)
+        self.pool = None
+        self.poolLayout = None
+
     def getAction(self, gameState):
         """
           Returns the minimax action from the current gameState using self.depth
@@ -124,71 +535,431 @@ class MinimaxAgent(MultiAgentSearchAgent):
             agentIndex=0 means Pacman, ghosts are >= 1
           gameState.generateSuccessor(agentIndex, action):
             Returns the successor game state after an agent takes an action
+          gameState.generateSuccessorUnchecked(agentIndex, action):
+            Same, but trusts that the action came from getLegalActions
           gameState.getNumAgents():
             Returns the total number of agents in the game
         """
         print("MinimaxAgent with depth ", self.depth)
+        return self.deepen(gameState, self.bestAction)
+
+    def bestAction(self, gameState):
+        if self.workers > 1:
+            return self.parallelBestAction(gameState)
         legal = gameState.getLegalActions(0)
-        successors = [gameState.generateSuccessor(0, action) for action in legal]
         maxValue = -float('inf')
         goalIndex = 0
-        for x in range(len(successors)):
-            actionValue = self.value(successors[x], 1, 0)
+        for x, (action, successor) in enumerate(self.children(gameState, legal, 0)):
+            actionValue = self.value(successor, 1, 0)
+            if actionValue > maxValue:
+                maxValue = actionValue
+                goalIndex = x
+
+        return legal[goalIndex]
+
+    def parallelBestAction(self, gameState):
+        """
+        Same as bestAction, but searches the subtrees below the split point
+        in the worker processes.
+        """
+        legal = gameState.getLegalActions(0)
+        # Split one ply down if the root alone gives every worker a subtree
+        plies = 1
+        if len(legal) < self.workers:
+            plies = self.MAX_SPLIT_PLIES
+        tasks = []
+        leaves = []
+        trees = [self.expandTree(self.successor(gameState, 0, action), 1, 0, plies - 1, tasks, leaves)
+                 for action in legal]
+        leafValues = self.evaluateLeaves(leaves)
+
+        # Workers stop at the deadline themselves: cancelling a future cannot
+        # stop a subtree that is already being searched, and one left running
+        # would hold up the next move's search
+        deadline = None
+        if self.canAbort:
+            deadline = self.deadline
+        pool = self.getPool(gameState)
+        futures = [pool.submit(searchSubtree, key, agentIndex, depthSoFar, self.searchDepth, deadline)
+                   for key, agentIndex, depthSoFar in tasks]
+        timeout = None
+        if deadline is not None:
+            timeout = max(0.0, deadline - time.time())
+        done, notDone = wait(futures, timeout)
+        if notDone:
+            for future in notDone:
+                future.cancel()
+            raise SearchAborted()
+        values = []
+        for future in futures:
+            value, nodes = future.result()
+            self.nodes += nodes
+            if value is None:
+                raise SearchAborted()
+            values.append(value)
+
+        maxValue = -float('inf')
+        goalIndex = 0
+        for x in range(len(trees)):
+            actionValue = self.combine(trees[x], leafValues, values)
             if actionValue > maxValue:
                 maxValue = actionValue
                 goalIndex = x
 
         return legal[goalIndex]
 
+    def getPool(self, gameState):
+        """
+        Returns the worker pool, starting it for the layout of gameState if
+        it is not running on that layout already.
+        """
+        layout = gameState.data.layout
+        if self.pool is None or self.poolLayout is not layout:
+            if self.pool is not None:
+                self.pool.shutdown()
+            self.pool = ProcessPoolExecutor(self.workers, initializer=initSearchWorker,
+                                            initargs=(layout.layoutText, self.evaluationFunction,
+                                                      self.evaluateBatch, self.bestReply))
+            self.poolLayout = layout
+        return self.pool
+
     def MAXvalue(self, gameState, agentIndex, depthSoFar):
         legal = gameState.getLegalActions(agentIndex)
-        successors = [gameState.generateSuccessor(agentIndex, action) for action in legal]
         x = -float('inf')
-        for successor in successors:
+        for action, successor in self.children(gameState, legal, agentIndex):
             x = max(x, self.value(successor, 1, depthSoFar))
         return x
 
     def MINvalue(self, gameState, agentIndex, depthSoFar):
-        legal = gameState.getLegalActions(agentIndex)
-        successors = [gameState.generateSuccessor(agentIndex, action) for action in legal]
+        moves, nextAgent, nextDepth = self.ghostMoves(gameState, agentIndex, depthSoFar)
+        if not moves:
+            return self.value(gameState, nextAgent, nextDepth)
         x = float('inf')
-        for successor in successors:
-            if agentIndex + 1 == gameState.getNumAgents():  # all the ghost(s) finished their turn, Pacman next
-                x = min(x, self.value(successor, 0, depthSoFar + 1))
-            else:  # Another ghost's turn
-                x = min(x, self.value(successor, agentIndex + 1, depthSoFar))
+        for move, successor in self.children(gameState, moves):
+            x = min(x, self.value(successor, nextAgent, nextDepth))
         return x
 
     def value(self, gameState, agentIndex, depthSoFar):
 
         "If requisite no. of searches complete, evaluation function"
-        if depthSoFar == self.depth or gameState.isWin() or gameState.isLose():
+        if depthSoFar == self.searchDepth or gameState.isWin() or gameState.isLose():
             return self.evaluationFunction(gameState)
-        "If agentIndex is 0, perform MAX"
-        if agentIndex == 0:
-            return self.MAXvalue(gameState, agentIndex, depthSoFar)
-        "Else (if agentindex > 0), perform MIN"
-        if agentIndex > 0:
-            return self.MINvalue(gameState, agentIndex, depthSoFar)
+        if self.table is not None:
+            key = (gameState.key(), agentIndex)
+            plies = self.pliesLeft(gameState, agentIndex, depthSoFar)
+            entry = self.table.lookup(key, plies)
+            if entry is not None:
+                return entry[1]
+        if self.evaluateBatch is not None and depthSoFar == self.searchDepth - 1:
+            x = self.batchValue(gameState, agentIndex, depthSoFar)
+        elif agentIndex == 0:
+            "If agentIndex is 0, perform MAX"
+            x = self.MAXvalue(gameState, agentIndex, depthSoFar)
+        else:
+            "Else (if agentindex > 0), perform MIN"
+            x = self.MINvalue(gameState, agentIndex, depthSoFar)
+        if self.table is not None:
+            self.table.store(key, plies, x, TranspositionTable.EXACT, None)
+        return x
+
+
+# The layout and MinimaxAgent of a worker process of MinimaxAgent's pool
+searchWorker = None
+
+
+def initSearchWorker(layoutText, evaluationFunction, evaluateBatch, bestReply):
+    """
+    Starts a worker process with a MinimaxAgent that searches the way the
+    pool's agent does.
+    """
+    global searchWorker
+    import layout
+    agent = MinimaxAgent()
+    agent.evaluationFunction = evaluationFunction
+    agent.evaluateBatch = evaluateBatch
+    agent.bestReply = bestReply
+    searchWorker = (layout.Layout(list(layoutText)), agent)
+
+
+def searchSubtree(key, agentIndex, depthSoFar, searchDepth, deadline=None):
+    """
+    Runs in a worker process: returns the minimax value of the state with
+    the given key, and the number of states generated to find it.  The
+    value is None if the search was abandoned at the deadline.
+    """
+    import pacman
+    workerLayout, agent = searchWorker
+    agent.searchDepth = searchDepth
+    agent.nodes = 0
+    agent.deadline = deadline
+    agent.canAbort = deadline is not None
+    if agent.canAbort and time.time() > deadline:
+        return None, 0
+    try:
+        value = agent.value(pacman.GameState.fromKey(workerLayout, key), agentIndex, depthSoFar)
+    except SearchAborted:
+        return None, agent.nodes
+    return value, agent.nodes
 
 
 class AlphaBetaAgent(MultiAgentSearchAgent):
     """
     Your minimax agent with alpha-beta pruning (question 3)
+
+    By default this searches straight to self.depth, trying moves in the
+    order getLegalActions returns them.  Options (pass them with -a):
+
+      iterative=True   deepen one level at a time up to self.depth, trying the
+                       best line found by the previous level first at every
+                       node along it
+      nodeLimit=N      with iterative, stop once N states have been generated
+                       and play the move of the deepest completed level
+      time=T           as for every search agent; implies iterative
+      tt=N             keep up to N searched positions in a transposition
+                       table; the best move stored for a position is also
+                       tried first (ttPolicy=lru or depth picks what is
+                       evicted when it is full)
+      ordering=True    after those, try killer moves (the last two moves that
+                       caused a cutoff at the same ply) and then the rest by
+                       history score (how often a move from the same cell
+                       caused cutoffs).  Both are kept for the whole game,
+                       and history scores are halved at every move
+      engine=pvs       principal variation search: after the first move at a
+                       node, test each move with a null window (alpha, alpha)
+                       at Pacman's nodes, (beta, beta) at the ghosts') and
+                       only search it fully if it could be better
+      aspiration=W     with iterative, search each level with the window
+                       (v - W, v + W) around the previous level's value v,
+                       and again with the full window if the value falls
+                       outside it.  Scores move in steps of 10 for food, 200
+                       for ghosts and 500 for winning or losing, so a window
+                       of a few steps of food is usually enough
+
+    Cutoffs are strict here (a value equal to beta does not cut), so a
+    search with window (alpha, beta) returns the exact value when it lies
+    between alpha and beta inclusive, and otherwise a bound beyond the
+    side it fell out of.  That makes (alpha, alpha) a valid null window.
     """
 
+    ENGINES = ('alphabeta', 'pvs')
+
+    # Killer moves kept per ply
+    NUM_KILLERS = 2
+
+    def __init__(self, evalFn='scoreEvaluationFunction', depth='2', tt='0', ttPolicy='lru',
+                 time='0', batch='True', bestReply='False', iterative='False', nodeLimit='0',
+                 ordering='False', engine='alphabeta', aspiration='0', fast='False'):
+        MultiAgentSearchAgent.__init__(self, evalFn, depth, tt, ttPolicy, time, batch, bestReply, fast)
+        self.iterative = parseFlag(iterative)
+        self.nodeLimit = int(nodeLimit)
+        self.ordering = parseFlag(ordering)
+        if engine not in self.ENGINES:
+            raise Exception("Unknown search engine: " + engine)
+        self.pvs = engine == 'pvs'
+        self.aspiration = float(aspiration)
+        self.bestLine = ()
+        self.bestValue = None
+        self.killers = {}  # ply -> moves that caused cutoffs there, latest first
+        self.history = {}  # (agentIndex, cell, action) -> cutoff score
+
+    def registerInitialState(self, gameState):
+        self.killers = {}
+        self.history = {}
+
     def getAction(self, gameState):
         """
         Returns the minimax action using self.depth and self.evaluationFunction
         """
-        "*** YOUR CODE HERE ***"
-        util.raiseNotDefined()
+        self.bestLine = ()
+        self.bestValue = None
+        if self.ordering:
+            # Let what happened recently count for more
+            self.history = dict([(key, score // 2) for key, score in self.history.items() if score > 1])
+        return self.deepen(gameState, self.bestAction)
+
+    def bestAction(self, gameState):
+        # Each level tries the best line of the level before first
+        line = self.bestLine
+        if self.aspiration > 0 and self.bestValue is not None:
+            alpha = self.bestValue - self.aspiration
+            beta = self.bestValue + self.aspiration
+            value, line = self.value(gameState, 0, 0, alpha, beta, line)
+            if value < alpha or value > beta:
+                value, line = self.value(gameState, 0, 0, -float('inf'), float('inf'), line)
+        else:
+            value, line = self.value(gameState, 0, 0, -float('inf'), float('inf'), line)
+        self.bestValue = value
+        self.bestLine = line
+        return line[0]
+
+    def orderedMoves(self, moves, line, tableMove=None):
+        """
+        Returns moves with the first move of line, if any, moved to the
+        front, and the rest of line to follow after that move.  If line is
+        empty, tableMove goes first instead.
+        """
+        if line and line[0] in moves:
+            moves = [line[0]] + [move for move in moves if move != line[0]]
+            return moves, line[1:]
+        if tableMove is not None and tableMove in moves:
+            moves = [tableMove] + [move for move in moves if move != tableMove]
+        return moves, ()
+
+    def historyKey(self, gameState, move):
+        """
+        Returns the history table key of a move: Pacman's action, or a
+        ghost's (ghostIndex, action).
+        """
+        if isinstance(move, tuple):
+            ghostIndex, action = move
+            return (ghostIndex, gameState.getGhostPosition(ghostIndex), action)
+        return (0, gameState.getPacmanPosition(), move)
+
+    def heuristicOrder(self, gameState, moves, ply):
+        """
+        Returns moves with the killers of ply first and the rest by history
+        score, keeping the given order among equals.
+        """
+        killers = [move for move in self.killers.get(ply, ()) if move in moves]
+        others = [move for move in moves if move not in killers]
+        history = self.history
+        if len(others) > 1 and history:
+            others.sort(key=lambda move: -history.get(self.historyKey(gameState, move), 0))
+        return killers + others
+
+    def recordCutoff(self, gameState, move, ply, plies):
+        killers = self.killers.get(ply, [])
+        if move not in killers:
+            self.killers[ply] = [move] + killers[:self.NUM_KILLERS - 1]
+        key = self.historyKey(gameState, move)
+        self.history[key] = self.history.get(key, 0) + plies * plies
+
+    def MAXvalue(self, gameState, agentIndex, depthSoFar, alpha, beta, line, tableMove=None):
+        legal = gameState.getLegalActions(agentIndex)
+        if self.ordering:
+            ply = depthSoFar * gameState.getNumAgents()
+            legal = self.heuristicOrder(gameState, legal, ply)
+        legal, rest = self.orderedMoves(legal, line, tableMove)
+        x = -float('inf')
+        bestLine = ()
+        for action in legal:
+            successor = self.successor(gameState, agentIndex, action)
+            if self.pvs and bestLine:
+                v, childLine = self.value(successor, 1, depthSoFar, alpha, alpha, rest)
+                if alpha < v <= beta:
+                    v, childLine = self.value(successor, 1, depthSoFar, alpha, beta, rest)
+            else:
+                v, childLine = self.value(successor, 1, depthSoFar, alpha, beta, rest)
+            rest = ()
+            if v > x:
+                x = v
+                bestLine = (action,) + childLine
+            if x > beta:
+                if self.ordering:
+                    self.recordCutoff(gameState, action, ply,
+                                      self.pliesLeft(gameState, agentIndex, depthSoFar))
+                return x, bestLine
+            alpha = max(alpha, x)
+        return x, bestLine
+
+    def MINvalue(self, gameState, agentIndex, depthSoFar, alpha, beta, line, tableMove=None):
+        # Ghost moves are (ghostIndex, action) pairs, in lines and in the table
+        moves, nextAgent, nextDepth = self.ghostMoves(gameState, agentIndex, depthSoFar)
+        if not moves:
+            # The ghosts pass, which shows as None in lines
+            v, childLine = self.value(gameState, nextAgent, nextDepth, alpha, beta, line[1:])
+            return v, (None,) + childLine
+        if self.ordering:
+            ply = depthSoFar * gameState.getNumAgents() + agentIndex
+            moves = self.heuristicOrder(gameState, moves, ply)
+        moves, rest = self.orderedMoves(moves, line, tableMove)
+        x = float('inf')
+        bestLine = ()
+        for move in moves:
+            successor = self.successor(gameState, move[0], move[1])
+            if self.pvs and bestLine:
+                v, childLine = self.value(successor, nextAgent, nextDepth, beta, beta, rest)
+                if alpha <= v < beta:
+                    v, childLine = self.value(successor, nextAgent, nextDepth, alpha, beta, rest)
+            else:
+                v, childLine = self.value(successor, nextAgent, nextDepth, alpha, beta, rest)
+            rest = ()
+            if v < x:
+                x = v
+                bestLine = (move,) + childLine
+            if x < alpha:
+                if self.ordering:
+                    self.recordCutoff(gameState, move, ply,
+                                      self.pliesLeft(gameState, agentIndex, depthSoFar))
+                return x, bestLine
+            beta = min(beta, x)
+        return x, bestLine
+
+    def value(self, gameState, agentIndex, depthSoFar, alpha, beta, line):
+        """
+        Returns the minimax value of gameState and the line of play that
+        leads to it.  line is the line to try first, from this state on.
+        """
+        if depthSoFar == self.searchDepth or gameState.isWin() or gameState.isLose():
+            return self.evaluationFunction(gameState), ()
+        table = self.table
+        tableMove = None
+        # The root is always searched, so there is a whole line to play
+        if table is not None and (depthSoFar > 0 or agentIndex > 0):
+            key = (gameState.key(), agentIndex)
+            plies = self.pliesLeft(gameState, agentIndex, depthSoFar)
+            entry = table.lookup(key, plies)
+            if entry is not None:
+                entryValue, bound, tableMove = entry[1:4]
+                if (bound == TranspositionTable.EXACT or
+                        (bound == TranspositionTable.LOWER and entryValue > beta) or
+                        (bound == TranspositionTable.UPPER and entryValue < alpha)):
+                    return entryValue, (tableMove,)
+            else:
+                tableMove = table.getMove(key)
+        if agentIndex == 0:
+            x, bestLine = self.MAXvalue(gameState, agentIndex, depthSoFar, alpha, beta, line, tableMove)
+        else:
+            x, bestLine = self.MINvalue(gameState, agentIndex, depthSoFar, alpha, beta, line, tableMove)
+        if table is not None and (depthSoFar > 0 or agentIndex > 0):
+            # Cutoffs are strict, so only values outside the window are bounds
+            if x > beta:
+                bound = TranspositionTable.LOWER
+            elif x < alpha:
+                bound = TranspositionTable.UPPER
+            else:
+                bound = TranspositionTable.EXACT
+            table.store(key, plies, x, bound, bestLine[0])
+        return x, bestLine
 
 
 class ExpectimaxAgent(MultiAgentSearchAgent):
     """
       Your expectimax agent (question 4)
+
+    Passing star=1 prunes chance nodes with Ballard's Star1: the value of
+    every state lies between bounds the evaluation function declares (its
+    valueBounds(gameState, plies) attribute, see scoreBounds), so once the
+    moves searched so far put the average out of the (alpha, beta) window
+    whatever the rest turn out to be, the rest are skipped.  star=2 adds
+    Star2: before searching a chance node's Pacman nodes in full, each is
+    probed with just its first move, whose value is a lower bound on it,
+    which can cut the chance node off early and tightens the windows of
+    the full searches.  The move chosen is the same either way.  Values
+    are then only exact inside the window, as in AlphaBetaAgent.
     """
+    ghostNode = 'exp'
+
+    def __init__(self, evalFn='scoreEvaluationFunction', depth='2', tt='0', ttPolicy='lru',
+                 time='0', batch='True', bestReply='False', star='0', fast='False'):
+        MultiAgentSearchAgent.__init__(self, evalFn, depth, tt, ttPolicy, time, batch, bestReply, fast)
+        self.star = int(star)
+        self.valueBounds = None
+        if self.star:
+            self.valueBounds = getattr(self.evaluationFunction, 'valueBounds', None)
+            if self.valueBounds is None:
+                raise Exception("The evaluation function declares no valueBounds for star")
+        self.lowest, self.highest = -float('inf'), float('inf')
 
     def getAction(self, gameState):
         """
@@ -197,8 +968,312 @@ class ExpectimaxAgent(MultiAgentSearchAgent):
         All ghosts should be modeled as choosing uniformly at random from their
         legal moves.
         """
-        "*** YOUR CODE HERE ***"
-        util.raiseNotDefined()
+        if self.star:
+            self.lowest, self.highest = self.valueBounds(gameState, self.depth)
+        return self.deepen(gameState, self.bestAction)
+
+    def bestAction(self, gameState):
+        legal = gameState.getLegalActions(0)
+        maxValue = -float('inf')
+        goalIndex = 0
+        for x in range(len(legal)):
+            # Only values above maxValue matter, so the window starts there
+            actionValue = self.value(self.successor(gameState, 0, legal[x]), 1, 0, maxValue)
+            if actionValue > maxValue:
+                maxValue = actionValue
+                goalIndex = x
+
+        return legal[goalIndex]
+
+    def MAXvalue(self, gameState, agentIndex, depthSoFar, alpha, beta):
+        x = -float('inf')
+        for action in gameState.getLegalActions(agentIndex):
+            successor = self.successor(gameState, agentIndex, action)
+            x = max(x, self.value(successor, 1, depthSoFar, max(alpha, x), beta))
+            if x > beta:
+                return x
+        return x
+
+    def EXPvalue(self, gameState, agentIndex, depthSoFar, alpha, beta):
+        # With bestReply, each (ghostIndex, action) move of the nearby ghosts
+        # is equally likely, so ghosts with more legal moves weigh more
+        moves, nextAgent, nextDepth = self.ghostMoves(gameState, agentIndex, depthSoFar)
+        if not moves:
+            return self.value(gameState, nextAgent, nextDepth, alpha, beta)
+        if not self.star:
+            total = 0.0
+            for ghostIndex, action in moves:
+                successor = self.successor(gameState, ghostIndex, action)
+                total += self.value(successor, nextAgent, nextDepth)
+            return total / len(moves)
+
+        # Star1: the average stays in (alpha, beta) only if each move's value
+        # does given the ones searched and the bounds on the ones left
+        lowest, highest = self.lowest, self.highest
+        n = len(moves)
+        lower = [lowest] * n
+        successors = None
+        if self.star == 2 and nextAgent == 0 and nextDepth < self.searchDepth:
+            # Star2: a Pacman node is worth at least its first move.  The
+            # successors are kept for the full searches after the probes.
+            successors = []
+            known = 0.0
+            for i, (move, successor) in enumerate(self.children(gameState, moves)):
+                successors.append(successor)
+                cut = n * beta - known - lowest * (n - i - 1)
+                if successor.isWin() or successor.isLose():
+                    probe = self.evaluationFunction(successor)
+                else:
+                    action = successor.getLegalActions(0)[0]
+                    # Anything below cut comes back exact, so it is a lower bound
+                    probe = self.value(self.successor(successor, 0, action), 1, nextDepth,
+                                       lowest, cut)
+                if probe > cut:
+                    return (known + probe + lowest * (n - i - 1)) / n
+                lower[i] = probe
+                known += probe
+        total = 0.0
+        rest = sum(lower)
+        for i, move in enumerate(moves):
+            rest -= lower[i]
+            low = n * alpha - total - highest * (n - i - 1)
+            high = n * beta - total - rest
+            # Values never leave the bounds, so the result can be certain
+            if low > highest:
+                return (total + highest * (n - i)) / n
+            if high < lowest:
+                return (total + lowest + rest) / n
+            if successors is not None:
+                successor = successors[i]
+            else:
+                successor = self.successor(gameState, move[0], move[1])
+            v = self.value(successor, nextAgent, nextDepth, max(low, lowest), min(high, highest))
+            if v < low:
+                return (total + v + highest * (n - i - 1)) / n
+            if v > high:
+                return (total + v + rest) / n
+            total += v
+        return total / n
+
+    def value(self, gameState, agentIndex, depthSoFar, alpha=-float('inf'), beta=float('inf')):
+        if depthSoFar == self.searchDepth or gameState.isWin() or gameState.isLose():
+            return self.evaluationFunction(gameState)
+        if self.table is not None:
+            key = (gameState.key(), agentIndex)
+            plies = self.pliesLeft(gameState, agentIndex, depthSoFar)
+            entry = self.table.lookup(key, plies)
+            if entry is not None:
+                entryValue, bound = entry[1:3]
+                if (bound == TranspositionTable.EXACT or
+                        (bound == TranspositionTable.LOWER and entryValue > beta) or
+                        (bound == TranspositionTable.UPPER and entryValue < alpha)):
+                    return entryValue
+        if self.evaluateBatch is not None and depthSoFar == self.searchDepth - 1:
+            x = self.batchValue(gameState, agentIndex, depthSoFar)
+        elif agentIndex == 0:
+            x = self.MAXvalue(gameState, agentIndex, depthSoFar, alpha, beta)
+        else:
+            x = self.EXPvalue(gameState, agentIndex, depthSoFar, alpha, beta)
+        if self.table is not None:
+            # Without star nothing is pruned, so every value is exact
+            if self.star and x > beta:
+                bound = TranspositionTable.LOWER
+            elif self.star and x < alpha:
+                bound = TranspositionTable.UPPER
+            else:
+                bound = TranspositionTable.EXACT
+            self.table.store(key, plies, x, bound, None)
+        return x
+
+
+class MCTSNode:
+    """
+    A node of the Monte Carlo search tree: the statistics of the simulations
+    that made a sequence of Pacman moves, and the node after each next move.
+    """
+    __slots__ = ('visits', 'total', 'children')
+
+    def __init__(self):
+        self.visits = 0
+        self.total = 0.0
+        self.children = {}
+
+
+class MCTSAgent(Agent):
+    """
+    A Pacman agent that plans with Monte Carlo tree search (UCT).
+
+    Each simulation walks down the tree of Pacman's moves, picking moves by
+    UCT and sampling the ghosts' replies from a ghost model, adds one new
+    node, plays a quick random rollout from there and scores the state it
+    reaches with the evaluation function.  The tree only branches on
+    Pacman's moves, so its cost grows with the budget and not with the
+    number of ghosts.  Options (pass them with -a):
+
+      iterations=N     simulations per move (0 for no limit)
+      time=T           seconds per move (0 for no limit)
+      ghosts=G         'random' or 'directional', how ghosts are assumed to move
+      rolloutDepth=N   rounds of moves in each rollout
+      exploration=C    UCT exploration constant, scaled by the spread of the
+                       values seen so far
+      evalFn=F         scores the state at the end of a rollout
+      reuse=False      start every move with a new tree; by default the
+                       subtree below the move played is kept, since the tree
+                       does not depend on what the ghosts actually did
+    """
+
+    GHOST_MODELS = {'random': RandomGhost, 'directional': DirectionalGhost}
+
+    def __init__(self, evalFn='betterEvaluationFunction', iterations='300', time='0',
+                 ghosts='directional', rolloutDepth='10', exploration='1.4', reuse='True'):
+        self.index = 0  # Pacman is always agent index 0
+        self.evaluationFunction = util.lookup(evalFn, globals())
+        self.iterations = int(iterations)
+        self.timeLimit = float(time)
+        if self.iterations <= 0 and self.timeLimit <= 0:
+            raise Exception("MCTSAgent needs an iteration or time budget")
+        if ghosts not in self.GHOST_MODELS:
+            raise Exception("Unknown ghost model: " + ghosts)
+        self.ghostModel = self.GHOST_MODELS[ghosts]
+        self.ghostAgents = []
+        self.rolloutDepth = int(rolloutDepth)
+        self.exploration = float(exploration)
+        self.reuse = parseFlag(reuse)
+        self.simulations = 0
+        self.minValue = 0.0
+        self.maxValue = 0.0
+        # The subtree kept for the next move, and where it expects Pacman
+        self.nextRoot = None
+        self.nextPosition = None
+
+    def registerInitialState(self, gameState):
+        self.nextRoot = None
+        self.nextPosition = None
+
+    def getAction(self, gameState):
+        numGhosts = gameState.getNumAgents() - 1
+        if len(self.ghostAgents) != numGhosts:
+            self.ghostAgents = [self.ghostModel(i + 1) for i in range(numGhosts)]
+        deadline = None
+        if self.timeLimit > 0:
+            deadline = time.time() + self.timeLimit
+        root = self.nextRoot
+        if root is None or gameState.getPacmanPosition() != self.nextPosition:
+            root = MCTSNode()
+        self.simulations = 0
+        self.minValue = float('inf')
+        self.maxValue = -float('inf')
+        while not (self.iterations and self.simulations >= self.iterations):
+            if deadline is not None and time.time() > deadline:
+                break
+            self.simulate(gameState, root)
+            self.simulations += 1
+
+        # Play the most visited move
+        legal = self.treeActions(gameState)
+        bestAction = None
+        bestVisits = 0
+        for action in legal:
+            child = root.children.get(action)
+            if child is not None and child.visits > bestVisits:
+                bestAction = action
+                bestVisits = child.visits
+        if bestAction is None:
+            bestAction = random.choice(legal)
+        if self.reuse:
+            self.nextRoot = root.children.get(bestAction)
+            self.nextPosition = Actions.getSuccessor(gameState.getPacmanPosition(), bestAction)
+        return bestAction
+
+    def simulate(self, gameState, root):
+        node = root
+        path = [node]
+        while not (gameState.isWin() or gameState.isLose()):
+            legal = self.treeActions(gameState)
+            untried = [action for action in legal if action not in node.children]
+            if untried:
+                action = random.choice(untried)
+                child = MCTSNode()
+                node.children[action] = child
+                node = child
+                gameState = self.playRound(gameState, action)
+                path.append(node)
+                break
+            action = self.select(node, legal)
+            node = node.children[action]
+            gameState = self.playRound(gameState, action)
+            path.append(node)
+        value = self.rollout(gameState)
+        self.minValue = min(self.minValue, value)
+        self.maxValue = max(self.maxValue, value)
+        for node in path:
+            node.visits += 1
+            node.total += value
+
+    def treeActions(self, gameState):
+        """
+        Pacman's moves in the tree.  Stopping is left out while there is
+        anywhere to go, since it only lets the ghosts close in.
+        """
+        legal = gameState.getLegalActions(0)
+        moves = [action for action in legal if action != Directions.STOP]
+        return moves or legal
+
+    def select(self, node, legal):
+        """
+        Returns the UCT choice among the moves in legal, which have all been
+        tried from node.
+        """
+        scale = self.exploration * max(self.maxValue - self.minValue, 1.0)
+        logVisits = math.log(node.visits)
+        bestAction = None
+        bestScore = -float('inf')
+        for action in legal:
+            child = node.children[action]
+            score = child.total / child.visits + scale * math.sqrt(logVisits / child.visits)
+            if score > bestScore:
+                bestAction = action
+                bestScore = score
+        return bestAction
+
+    def playRound(self, gameState, action):
+        """
+        Returns the state after Pacman plays action and the ghosts reply.
+        """
+        gameState = gameState.generateSuccessorUnchecked(0, action)
+        for ghost in self.ghostAgents:
+            if gameState.isWin() or gameState.isLose():
+                break
+            gameState = gameState.generateSuccessorUnchecked(ghost.index, ghost.getAction(gameState))
+        return gameState
+
+    def rolloutAction(self, gameState):
+        """
+        Pacman's rollout policy: a random move, without stopping or turning
+        back unless there is no other way.
+        """
+        legal = gameState.getLegalActions(0)
+        reverse = Actions.reverseDirection(gameState.getPacmanState().configuration.direction)
+        choices = [action for action in legal if action != Directions.STOP and action != reverse]
+        if not choices:
+            choices = [action for action in legal if action != Directions.STOP] or legal
+        return random.choice(choices)
+
+    def rollout(self, gameState):
+        """
+        Plays rolloutDepth rounds from gameState and returns the value of
+        where it ends.  gameState is not used again after this, so the moves
+        are applied to it in place.
+        """
+        for step in range(self.rolloutDepth):
+            if gameState.isWin() or gameState.isLose():
+                break
+            gameState.apply(0, self.rolloutAction(gameState))
+            for ghost in self.ghostAgents:
+                if gameState.isWin() or gameState.isLose():
+                    break
+                gameState.apply(ghost.index, ghost.getAction(gameState))
+        return self.evaluationFunction(gameState)
 
 
 def betterEvaluationFunction(currentGameState):
@@ -206,10 +1281,109 @@ def betterEvaluationFunction(currentGameState):
     Your extreme ghost-hunting, pellet-nabbing, food-gobbling, unstoppable
     evaluation function (question 5).
 
-    DESCRIPTION: <write something here so we know what you did>
+    DESCRIPTION: Starts from the game score, then
+      - subtracts 4 per food and 20 per capsule left, so eating is good
+      - adds 10 / the distance to the nearest food, to head for food
+      - adds 100 / (distance + 1) for each scared ghost that Pacman can reach
+        before it recovers, to hunt it
+      - subtracts 200 for each active ghost within one step
+    evaluateBetterBatch computes the same values for many states at once.
+    """
+    pacmanPosition = currentGameState.getPacmanPosition()
+    value = currentGameState.getScore()
+    value -= 4 * currentGameState.getNumFood()
+    value -= 20 * len(currentGameState.getCapsules())
+    foodList = currentGameState.data.getFoodList()
+    if foodList:
+        nearest = min([manhattanDistance(pacmanPosition, food) for food in foodList])
+        value += 10.0 / max(nearest, 1)
+    hunt = 0.0
+    danger = 0
+    for ghostState in currentGameState.getGhostStates():
+        distance = manhattanDistance(pacmanPosition, ghostState.getPosition())
+        if ghostState.scaredTimer > distance:
+            hunt += 100.0 / (distance + 1)
+        elif ghostState.scaredTimer == 0 and distance <= 1:
+            danger += 1
+    value += hunt
+    value -= 200 * danger
+    return value
+
+
+# NumPy arrays of recently seen food lists, keyed by the id of the list
+# (which the entry keeps alive)
+FOOD_ARRAY_CACHE = {}
+FOOD_ARRAY_CACHE_SIZE = 256
+
+
+def foodArray(foodList):
+    entry = FOOD_ARRAY_CACHE.get(id(foodList))
+    if entry is None or entry[0] is not foodList:
+        if len(FOOD_ARRAY_CACHE) >= FOOD_ARRAY_CACHE_SIZE:
+            FOOD_ARRAY_CACHE.clear()
+        entry = (foodList, numpy.array(foodList, dtype=float))
+        FOOD_ARRAY_CACHE[id(foodList)] = entry
+    return entry[1]
+
+
+def evaluateBetterBatch(states):
     """
-    "*** YOUR CODE HERE ***"
-    util.raiseNotDefined()
+    Returns betterEvaluationFunction of each of states, computed with NumPy
+    arrays over the whole batch if NumPy is installed.
+    """
+    if numpy is None or not states:
+        return [betterEvaluationFunction(state) for state in states]
+    pacmanPositions = numpy.array([state.getPacmanPosition() for state in states], dtype=float)
+    values = numpy.array([state.getScore() for state in states])
+    values -= 4 * numpy.array([state.getNumFood() for state in states])
+    values -= 20 * numpy.array([len(state.getCapsules()) for state in states])
+
+    # Siblings usually share one food list, so each list is converted once
+    byFoodList = {}
+    for i, state in enumerate(states):
+        foodList = state.data.getFoodList()
+        if foodList:
+            byFoodList.setdefault(id(foodList), (foodList, []))[1].append(i)
+    for foodList, indices in byFoodList.values():
+        food = foodArray(foodList)
+        positions = pacmanPositions[indices]
+        distances = numpy.abs(positions[:, None, :] - food[None, :, :]).sum(axis=2)
+        values[indices] += 10.0 / numpy.maximum(distances.min(axis=1), 1)
+
+    if states[0].getNumAgents() > 1:
+        ghostPositions = numpy.array([state.getGhostPositions() for state in states], dtype=float)
+        timers = numpy.array([[ghostState.scaredTimer for ghostState in state.getGhostStates()]
+                              for state in states])
+        distances = numpy.abs(ghostPositions - pacmanPositions[:, None, :]).sum(axis=2)
+        hunted = timers > distances
+        values += numpy.where(hunted, 100.0 / (distances + 1), 0.0).sum(axis=1)
+        values -= 200 * ((timers == 0) & (distances <= 1)).sum(axis=1)
+    return values
+
+
+def betterBounds(gameState, plies):
+    """
+    Returns the lowest and highest betterEvaluationFunction of any state
+    reachable from gameState in which Pacman has moved at most plies more
+    times, from scoreBounds and the most each of its terms can change.
+    """
+    low, high = scoreBounds(gameState, plies)
+    food, capsules, distances = reachable(gameState, plies)
+    low -= 4 * gameState.getNumFood() + 20 * len(gameState.getCapsules())
+    high -= 4 * (gameState.getNumFood() - food) + 20 * (len(gameState.getCapsules()) - capsules)
+    high += 10
+    for ghostState, distance in zip(gameState.getGhostStates(), distances):
+        if distance <= 2 * plies + 1:
+            low -= 200
+            high += 100
+        elif ghostState.scaredTimer > 0 or capsules:
+            # Out of reach, so it is neither eaten nor dangerous
+            high += 100.0 / (distance - 2 * plies + 1)
+    return low, high
+
+
+betterEvaluationFunction.evaluateBatch = evaluateBetterBatch
+betterEvaluationFunction.valueBounds = betterBounds
 
 
 # Abbreviation
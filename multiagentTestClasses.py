@@ -17,6 +17,7 @@
 #     state.isWin()
 #     state.isLose()
 #     state.generateSuccessor(agentIndex, action)
+#     state.generateSuccessorUnchecked(agentIndex, action)
 #     state.getScore()
 #           used by multiAgents.scoreEvaluationFunction, which is the default
 #
@@ -29,6 +30,7 @@ pp = PrettyPrinter()
 
 from game import Agent
 from pacman import GameState
+from pacman import ExploredTracking
 from ghostAgents import RandomGhost, DirectionalGhost
 import random
 import layout
@@ -52,6 +54,10 @@ class MultiagentTreeState(object):
         self.problem.generatedStates.add(successor)
         return MultiagentTreeState(self.problem, successor)
 
+    def generateSuccessorUnchecked(self, agentIndex, action):
+        # The tree has no rules to skip, so this is the same lookup
+        return self.generateSuccessor(agentIndex, action)
+
     def getScore(self):
         if VERBOSE:
             print("getScore(%s) -> %s" %
@@ -181,9 +187,9 @@ class GradingAgent(Agent):
         random.seed(self.seed)
 
     def getAction(self, state):
-        GameState.getAndResetExplored()
+        GameState.getAndResetNumExplored()
         studentAction = (self.studentAgent.getAction(state),
-                         len(GameState.getAndResetExplored()))
+                         GameState.getAndResetNumExplored())
         optimalActions = self.optimalActions[self.stepCount]
         altDepthActions = self.altDepthActions[self.stepCount]
         partialPlyBugActions = self.partialPlyBugActions[self.stepCount]
@@ -291,11 +297,11 @@ class PolyAgent(Agent):
 
     def getAction(self, state):
         # survey agents
-        GameState.getAndResetExplored()
+        GameState.getAndResetNumExplored()
         optimalActionLists = []
         for agent in self.solutionAgents:
             optimalActionLists.append((agent.getBestPacmanActions(
-                state)[0], len(GameState.getAndResetExplored())))
+                state)[0], GameState.getAndResetNumExplored()))
         alternativeDepthLists = [agent.getBestPacmanActions(
             state)[0] for agent in self.alternativeDepthAgents]
         partialPlyBugLists = [agent.getBestPacmanActions(
@@ -341,8 +347,10 @@ class PacmanGameTreeTest(testClasses.TestCase):
                            altDepthActions, partialPlyBugActions)
         # check return codes and assign grades
         disp = self.question.getDisplay()
-        stats = run(lay, self.layout_name, pac, [DirectionalGhost(
-            i + 1) for i in range(2)], disp, name=self.alg)
+        # The grader compares the number of distinct states explored
+        with ExploredTracking('set'):
+            stats = run(lay, self.layout_name, pac, [DirectionalGhost(
+                i + 1) for i in range(2)], disp, name=self.alg)
         if stats['timeouts'] > 0:
             self.addMessage('Agent timed out on smallClassic.  No credit')
             return self.testFail(grades)
@@ -391,8 +399,9 @@ class PacmanGameTreeTest(testClasses.TestCase):
             ourPacOptions = {}
         pac = PolyAgent(self.seed, multiAgents, ourPacOptions, self.depth)
         disp = self.question.getDisplay()
-        run(lay, self.layout_name, pac, [DirectionalGhost(
-            i + 1) for i in range(2)], disp, name=self.alg)
+        with ExploredTracking('set'):
+            run(lay, self.layout_name, pac, [DirectionalGhost(
+                i + 1) for i in range(2)], disp, name=self.alg)
         (optimalActions, altDepthActions, partialPlyBugActions) = pac.getTraces()
         # recover traces and record to file
         handle = open(filePath, 'w')
@@ -43,7 +43,8 @@ from game import GameStateData
 from game import Game
 from game import Directions
 from game import Actions
-from util import nearestPoint
+from game import Configuration
+from game import AgentState
 from util import manhattanDistance
 import layout
 import sys
@@ -69,20 +70,56 @@ class GameState:
 
     Note that in classic Pacman, Pacman is always agent 0.
     """
+    __slots__ = ('data',)
 
     ####################################################
     # Accessor methods: use these to access state data #
     ####################################################
 
-    # static variable keeps track of which states have had getLegalActions called
-    explored = set()
+    # static variable that records explored states; None when tracking is off.
+    # Select a mode with ExploredTracking (see below).
+    exploredTracker = None
 
     def getAndResetExplored():
-        tmp = GameState.explored.copy()
-        GameState.explored = set()
-        return tmp
+        """
+        Returns the set of states explored since the last reset.  States are
+        only kept in 'set' tracking mode; otherwise the set is empty.
+        """
+        tracker = GameState.exploredTracker
+        if tracker is None:
+            return set()
+        explored = tracker.getExplored()
+        tracker.reset()
+        return explored
     getAndResetExplored = staticmethod(getAndResetExplored)
 
+    def getAndResetNumExplored():
+        """
+        Returns how many states were explored since the last reset: distinct
+        states in 'set' mode, successors generated in 'count' mode and 0 when
+        tracking is off.
+        """
+        tracker = GameState.exploredTracker
+        if tracker is None:
+            return 0
+        numExplored = tracker.getNumExplored()
+        tracker.reset()
+        return numExplored
+    getAndResetNumExplored = staticmethod(getAndResetNumExplored)
+
+    def setExploredTracking(mode):
+        """
+        Selects how explored states are recorded: 'off', 'count' or 'set'.
+        """
+        if mode not in EXPLORED_TRACKERS:
+            raise Exception('Unknown explored state tracking mode ' + str(mode))
+        trackerClass = EXPLORED_TRACKERS[mode]
+        if trackerClass is None:
+            GameState.exploredTracker = None
+        else:
+            GameState.exploredTracker = trackerClass()
+    setExploredTracking = staticmethod(setExploredTracking)
+
     def getLegalActions(self, agentIndex=0):
         """
         Returns the legal actions for the agent specified.
@@ -104,31 +141,106 @@ class GameState:
         if self.isWin() or self.isLose():
             raise Exception('Can\'t generate a successor of a terminal state.')
 
+        return self._generateSuccessor(agentIndex, action, True)
+
+    def generateSuccessorUnchecked(self, agentIndex, action):
+        """
+        Returns the successor state after the specified agent takes the action,
+        trusting the caller instead of validating the move.
+
+        This is the fast path for search agents: the action must have come from
+        getLegalActions(agentIndex) on this same state, and this state must not
+        be a win or a loss.  Nothing checks this; an illegal action silently
+        produces an impossible state.  Game.run keeps using generateSuccessor.
+        """
+        return self._generateSuccessor(agentIndex, action, False)
+
+    def _generateSuccessor(self, agentIndex, action, check):
         # Copy current state
         state = GameState(self)
+        state._applyRules(agentIndex, action, check)
+        state.data.updateHash(self.data)
+        if GameState.exploredTracker is not None:
+            GameState.exploredTracker.record(self, state)
+        return state
 
+    def _applyRules(self, agentIndex, action, check):
+        """
+        Plays the move on this state, which must be a fresh copy of (or have
+        been reset like) its predecessor.
+        """
         # Let agent's logic deal with its action's effects on the board
         if agentIndex == 0:  # Pacman is moving
-            state.data._eaten = [False for i in range(state.getNumAgents())]
-            PacmanRules.applyAction(state, action)
+            self.data._eaten = [False for i in range(self.getNumAgents())]
+            PacmanRules.applyAction(self, action, check)
         else:                # A ghost is moving
-            GhostRules.applyAction(state, action, agentIndex)
+            GhostRules.applyAction(self, action, agentIndex, check)
 
         # Time passes
         if agentIndex == 0:
-            state.data.scoreChange += -TIME_PENALTY  # Penalty for waiting around
+            self.data.scoreChange += -TIME_PENALTY  # Penalty for waiting around
         else:
-            GhostRules.decrementTimer(state.data.agentStates[agentIndex])
+            GhostRules.decrementTimer(
+                self.data.getMutableAgentState(agentIndex))
 
         # Resolve multi-agent effects
-        GhostRules.checkDeath(state, agentIndex)
+        GhostRules.checkDeath(self, agentIndex)
+
+        # Ghost positions are only cached until a ghost moves or is eaten
+        if agentIndex != 0 or True in self.data._eaten:
+            self.data._ghostPositions = None
 
         # Book keeping
-        state.data._agentMoved = agentIndex
-        state.data.score += state.data.scoreChange
-        GameState.explored.add(self)
-        GameState.explored.add(state)
-        return state
+        self.data._agentMoved = agentIndex
+        self.data.score += self.data.scoreChange
+
+    def apply(self, agentIndex, action):
+        """
+        Makes the move on this state in place and returns an undo record that
+        undo() uses to restore the state exactly as it was.
+
+        This lets a depth-first search walk the whole tree on one state
+        instead of allocating a new GameState per node:
+
+          record = state.apply(agentIndex, action)
+          value = search(state)
+          state.undo(record)
+
+        As with generateSuccessorUnchecked, the action must come from
+        getLegalActions(agentIndex) on this state and the state must not be
+        terminal.  Undo records must be undone in reverse order.  Moves made
+        this way are not recorded by explored-state tracking.
+        """
+        data = self.data
+        if data._hash is None:
+            data._hash = data.getZobristKeys().stateKey(data)
+        record = (data.agentStates, data._ownedAgents, data.food, data._numFood,
+                  data._foodList, data.capsules, data.score, data.scoreChange,
+                  data._win, data._lose, data._eaten, data._foodEaten, data._foodAdded,
+                  data._capsuleEaten, data._agentMoved, data._hash, data._ghostPositions)
+
+        # Reset the per-move fields as GameStateData(prevState) would.  Agent
+        # states stay shared with the record and are copied when written.
+        data.agentStates = data.agentStates[:]
+        data._ownedAgents = 0
+        data._foodEaten = None
+        data._foodAdded = None
+        data._capsuleEaten = None
+        data.scoreChange = 0
+
+        self._applyRules(agentIndex, action, False)
+        data.deriveHash(record[15], record[0])
+        return record
+
+    def undo(self, record):
+        """
+        Restores the state to how it was before the apply() that returned record.
+        """
+        data = self.data
+        (data.agentStates, data._ownedAgents, data.food, data._numFood,
+         data._foodList, data.capsules, data.score, data.scoreChange,
+         data._win, data._lose, data._eaten, data._foodEaten, data._foodAdded,
+         data._capsuleEaten, data._agentMoved, data._hash, data._ghostPositions) = record
 
     def getLegalPacmanActions(self):
         return self.getLegalActions(0)
@@ -165,7 +277,7 @@ class GameState:
         return self.data.agentStates[agentIndex].getPosition()
 
     def getGhostPositions(self):
-        return [s.getPosition() for s in self.getGhostStates()]
+        return list(self.data.getGhostPositions())
 
     def getNumAgents(self):
         return len(self.data.agentStates)
@@ -176,11 +288,22 @@ class GameState:
     def getCapsules(self):
         """
         Returns a list of positions (x,y) of the remaining capsules.
+
+        The list is a copy: successors share their predecessor's capsules.
         """
-        return self.data.capsules
+        return list(self.data.capsules)
 
     def getNumFood(self):
-        return self.data.food.count()
+        return self.data._numFood
+
+    def getFoodList(self):
+        """
+        Returns a list of positions (x,y) of the remaining food.
+
+        Equivalent to getFood().asList(), but served from a cache that is
+        kept up to date as food is eaten.
+        """
+        return list(self.data.getFoodList())
 
     def getFood(self):
         """
@@ -227,7 +350,7 @@ class GameState:
         """
         Generates a new state by copying information from its predecessor.
         """
-        if prevState != None:  # Initial state
+        if prevState is not None:  # Initial state
             self.data = GameStateData(prevState.data)
         else:
             self.data = GameStateData()
@@ -237,6 +360,26 @@ class GameState:
         state.data = self.data.deepCopy()
         return state
 
+    def key(self):
+        """
+        Returns a compact immutable tuple of small ints and bitmasks that
+        encodes agent positions, directions, scared timers, food, capsules,
+        score and the win/loss flags.  Equal states have equal keys, and
+        GameState.fromKey(layout, key) rebuilds the state, which makes keys a
+        cheap representation for transposition tables, caches and messages
+        between processes.
+        """
+        return self.data.key()
+
+    def fromKey(layout, key):
+        """
+        Rebuilds a GameState from the layout it was played on and its key().
+        """
+        state = GameState()
+        state.data = GameStateData.fromKey(layout, key)
+        return state
+    fromKey = staticmethod(fromKey)
+
     def __eq__(self, other):
         """
         Allows two states to be compared.
@@ -259,6 +402,80 @@ class GameState:
         """
         self.data.initialize(layout, numGhostAgents)
 
+class ExploredCounter:
+    """
+    Counts generated successors without keeping any state alive.
+    """
+
+    def __init__(self):
+        self.numExplored = 0
+
+    def reset(self):
+        self.numExplored = 0
+
+    def record(self, state, successor):
+        self.numExplored += 1
+
+    def getNumExplored(self):
+        return self.numExplored
+
+    def getExplored(self):
+        return set()
+
+
+class ExploredSet:
+    """
+    Keeps every distinct state that was expanded or generated.  The
+    autograder uses this to check how many states a search touched.
+    """
+
+    def __init__(self):
+        self.explored = set()
+
+    def reset(self):
+        # A new set, so the one getExplored() returned before stays intact
+        self.explored = set()
+
+    def record(self, state, successor):
+        self.explored.add(state)
+        self.explored.add(successor)
+
+    def getNumExplored(self):
+        return len(self.explored)
+
+    def getExplored(self):
+        return self.explored
+
+
+EXPLORED_TRACKERS = {'off': None, 'count': ExploredCounter, 'set': ExploredSet}
+
+
+class ExploredTracking:
+    """
+    A context manager that selects how GameState records explored states
+    for the duration of a block, restoring the previous mode afterwards:
+
+      with ExploredTracking('set') as tracker:
+          ...
+          numExplored = tracker.getNumExplored()
+
+    Tracking is off by default, so normal games keep nothing alive.
+    """
+
+    def __init__(self, mode):
+        if mode not in EXPLORED_TRACKERS:
+            raise Exception('Unknown explored state tracking mode ' + str(mode))
+        self.mode = mode
+
+    def __enter__(self):
+        self.previous = GameState.exploredTracker
+        GameState.setExploredTracking(self.mode)
+        return GameState.exploredTracker
+
+    def __exit__(self, excType, excValue, traceback):
+        GameState.exploredTracker = self.previous
+        return False
+
 ############################################################################
 #                     THE HIDDEN SECRETS OF PACMAN                         #
 #                                                                          #
@@ -268,6 +485,8 @@ class GameState:
 
 SCARED_TIME = 40    # Moves ghosts are scared
 COLLISION_TOLERANCE = 0.7  # How close ghosts must be to Pacman to kill
+# The same tolerance in the half-cell units positions are stored in
+COLLISION_HALF_TOLERANCE = int(2 * COLLISION_TOLERANCE)
 TIME_PENALTY = 1  # Number of points lost each round
 
 
@@ -340,57 +559,74 @@ class PacmanRules:
     the classic game rules.
     """
     PACMAN_SPEED = 1
+    PACMAN_HALF_STEPS = int(2 * PACMAN_SPEED)
 
     def getLegalActions(state):
         """
         Returns a list of possible actions.
         """
-        return Actions.getPossibleActions(state.getPacmanState().configuration, state.data.layout.walls)
+        conf = state.data.agentStates[0].configuration
+        return PacmanRules.getConfigurationActions(conf, state.data.layout)
     getLegalActions = staticmethod(getLegalActions)
 
-    def applyAction(state, action):
+    def getConfigurationActions(conf, layout):
         """
-        Edits the state to reflect the results of the action.
+        Returns Pacman's legal actions from configuration conf on layout.
         """
-        legal = PacmanRules.getLegalActions(state)
-        if action not in legal:
-            raise Exception("Illegal action " + str(action))
+        actions = layout.getLegalActionTable().getPacmanActions(conf)
+        if actions is not None:
+            return list(actions)
+        return Actions.getPossibleActions(conf, layout.walls)
+    getConfigurationActions = staticmethod(getConfigurationActions)
 
-        pacmanState = state.data.agentStates[0]
+    def applyAction(state, action, check=True):
+        """
+        Edits the state to reflect the results of the action.  With check
+        False the action is trusted to be legal.
+        """
+        if check:
+            legal = PacmanRules.getLegalActions(state)
+            if action not in legal:
+                raise Exception("Illegal action " + str(action))
+
+        pacmanState = state.data.getMutableAgentState(0)
 
         # Update Configuration
-        vector = Actions.directionToVector(action, PacmanRules.PACMAN_SPEED)
-        pacmanState.configuration = pacmanState.configuration.generateSuccessor(
-            vector)
-
-        # Eat
-        next = pacmanState.configuration.getPosition()
-        nearest = nearestPoint(next)
-        if manhattanDistance(nearest, next) <= 0.5:
+        conf = pacmanState.configuration.generateHalfStepSuccessor(
+            action, PacmanRules.PACMAN_HALF_STEPS)
+        pacmanState.configuration = conf
+
+        # Eat, if within half a cell of a grid point
+        x, y = conf.halfPos
+        nearest = conf.getNearestPoint()
+        if abs(x - 2 * nearest[0]) + abs(y - 2 * nearest[1]) <= 1:
             # Remove food
             PacmanRules.consume(nearest, state)
     applyAction = staticmethod(applyAction)
 
     def consume(position, state):
         x, y = position
+        data = state.data
         # Eat food
-        if state.data.food[x][y]:
-            state.data.scoreChange += 10
-            state.data.food = state.data.food.copy()
-            state.data.food[x][y] = False
-            state.data._foodEaten = position
-            # TODO: cache numFood?
-            numFood = state.getNumFood()
-            if numFood == 0 and not state.data._lose:
-                state.data.scoreChange += 500
-                state.data._win = True
+        if data.food.isSet(x, y):
+            data.scoreChange += 10
+            data.food = data.food.copy()
+            data.food.unset(x, y)
+            data._foodEaten = position
+            data._numFood -= 1
+            if data._foodList is not None:
+                data._foodList = tuple([p for p in data._foodList if p != position])
+            if data._numFood == 0 and not data._lose:
+                data.scoreChange += 500
+                data._win = True
         # Eat capsule
-        if(position in state.getCapsules()):
-            state.data.capsules.remove(position)
-            state.data._capsuleEaten = position
+        if(position in data.capsules):
+            # The capsule list is shared with the predecessor, so replace it
+            data.capsules = [c for c in data.capsules if c != position]
+            data._capsuleEaten = position
             # Reset all ghosts' scared timers
-            for index in range(1, len(state.data.agentStates)):
-                state.data.agentStates[index].scaredTimer = SCARED_TIME
+            for index in range(1, len(data.agentStates)):
+                data.getMutableAgentState(index).scaredTimer = SCARED_TIME
     consume = staticmethod(consume)
 
 
@@ -399,6 +635,7 @@ class GhostRules:
     These functions dictate how ghosts interact with their environment.
     """
     GHOST_SPEED = 1.0
+    GHOST_HALF_STEPS = int(2 * GHOST_SPEED)
 
     def getLegalActions(state, ghostIndex):
         """
@@ -406,61 +643,77 @@ class GhostRules:
         reach a dead end, but can turn 90 degrees at intersections.
         """
         conf = state.getGhostState(ghostIndex).configuration
+        return GhostRules.getConfigurationActions(conf, state.data.layout)
+    getLegalActions = staticmethod(getLegalActions)
+
+    def getConfigurationActions(conf, layout):
+        """
+        Returns a ghost's legal actions from configuration conf on layout.
+        """
+        actions = layout.getLegalActionTable().getGhostActions(conf)
+        if actions is not None:
+            return list(actions)
         possibleActions = Actions.getPossibleActions(
-            conf, state.data.layout.walls)
+            conf, layout.walls)
         reverse = Actions.reverseDirection(conf.direction)
         if Directions.STOP in possibleActions:
             possibleActions.remove(Directions.STOP)
         if reverse in possibleActions and len(possibleActions) > 1:
             possibleActions.remove(reverse)
         return possibleActions
-    getLegalActions = staticmethod(getLegalActions)
+    getConfigurationActions = staticmethod(getConfigurationActions)
 
-    def applyAction(state, action, ghostIndex):
+    def applyAction(state, action, ghostIndex, check=True):
 
-        legal = GhostRules.getLegalActions(state, ghostIndex)
-        if action not in legal:
-            raise Exception("Illegal ghost action " + str(action))
+        if check:
+            legal = GhostRules.getLegalActions(state, ghostIndex)
+            if action not in legal:
+                raise Exception("Illegal ghost action " + str(action))
 
-        ghostState = state.data.agentStates[ghostIndex]
-        speed = GhostRules.GHOST_SPEED
+        ghostState = state.data.getMutableAgentState(ghostIndex)
+        halfSteps = GhostRules.GHOST_HALF_STEPS
         if ghostState.scaredTimer > 0:
-            speed /= 2.0
-        vector = Actions.directionToVector(action, speed)
-        ghostState.configuration = ghostState.configuration.generateSuccessor(
-            vector)
+            halfSteps //= 2
+        ghostState.configuration = ghostState.configuration.generateHalfStepSuccessor(
+            action, halfSteps)
     applyAction = staticmethod(applyAction)
 
     def decrementTimer(ghostState):
         timer = ghostState.scaredTimer
         if timer == 1:
-            ghostState.configuration.pos = nearestPoint(
-                ghostState.configuration.pos)
+            # Replace rather than edit the configuration, which may be shared
+            conf = ghostState.configuration
+            ghostState.configuration = Configuration(
+                conf.getNearestPoint(), conf.direction)
         ghostState.scaredTimer = max(0, timer - 1)
     decrementTimer = staticmethod(decrementTimer)
 
     def checkDeath(state, agentIndex):
-        pacmanPosition = state.getPacmanPosition()
+        pacmanPosition = state.data.agentStates[0].configuration.halfPos
         if agentIndex == 0:  # Pacman just moved; Anyone can kill him
             for index in range(1, len(state.data.agentStates)):
                 ghostState = state.data.agentStates[index]
-                ghostPosition = ghostState.configuration.getPosition()
-                if GhostRules.canKill(pacmanPosition, ghostPosition):
+                ghostPosition = ghostState.configuration.halfPos
+                if GhostRules.canKillHalfPosition(pacmanPosition, ghostPosition):
                     GhostRules.collide(state, ghostState, index)
         else:
             ghostState = state.data.agentStates[agentIndex]
-            ghostPosition = ghostState.configuration.getPosition()
-            if GhostRules.canKill(pacmanPosition, ghostPosition):
+            ghostPosition = ghostState.configuration.halfPos
+            if GhostRules.canKillHalfPosition(pacmanPosition, ghostPosition):
                 GhostRules.collide(state, ghostState, agentIndex)
     checkDeath = staticmethod(checkDeath)
 
     def collide(state, ghostState, agentIndex):
         if ghostState.scaredTimer > 0:
+            ghostState = state.data.getMutableAgentState(agentIndex)
             state.data.scoreChange += 200
             GhostRules.placeGhost(state, ghostState)
             ghostState.scaredTimer = 0
-            # Added for first-person
-            state.data._eaten[agentIndex] = True
+            # Added for first-person.  The list may be shared with the
+            # predecessor, so replace it rather than edit it
+            eaten = state.data._eaten[:]
+            eaten[agentIndex] = True
+            state.data._eaten = eaten
         else:
             if not state.data._win:
                 state.data.scoreChange -= 500
@@ -471,10 +724,299 @@ class GhostRules:
         return manhattanDistance(ghostPosition, pacmanPosition) <= COLLISION_TOLERANCE
     canKill = staticmethod(canKill)
 
+    def canKillHalfPosition(pacmanHalfPos, ghostHalfPos):
+        """
+        canKill for positions in half cells, using integer arithmetic only.
+        """
+        return abs(ghostHalfPos[0] - pacmanHalfPos[0]) + \
+            abs(ghostHalfPos[1] - pacmanHalfPos[1]) <= COLLISION_HALF_TOLERANCE
+    canKillHalfPosition = staticmethod(canKillHalfPosition)
+
     def placeGhost(state, ghostState):
         ghostState.configuration = ghostState.start
     placeGhost = staticmethod(placeGhost)
 
+
+FAST_RULES_CACHE = {}
+
+
+class FastRules:
+    """
+    The classic rules played on flat states, for search.  A flat state is
+    the tuple GameState.key() returns:
+
+      (score, flags, foodBits, capsuleBits, x0, y0, dir0, timer0, x1, ...)
+
+    and generateSuccessor builds the next one directly from tables made once
+    per layout, instead of copying GameStateData and AgentStates and going
+    through PacmanRules and GhostRules.  Legal actions, scores, scared
+    timers, collisions, wins and losses are the same as GameState's, so
+    toGameState(generateSuccessor(fromGameState(s), i, a)) equals
+    s.generateSuccessor(i, a).
+
+    FastGameState wraps a flat state in the GameState methods that search
+    agents and evaluation functions use.
+    """
+
+    def __init__(self, layout, numAgents):
+        self.layout = layout
+        self.numAgents = numAgents
+        self.height = layout.height
+        table = layout.getLegalActionTable()
+        self.pacmanActions = table.pacmanActions
+        # Ghost actions by cell and then by direction number
+        directions = GameStateData.KEY_DIRECTIONS
+        self.ghostActions = [None if actions is None else
+                             tuple([actions[d] for d in directions])
+                             for actions in table.ghostActions]
+        self.directionIndex = GameStateData.KEY_DIRECTION_INDEX
+        self.capsuleIndex = dict([(c, i) for i, c in enumerate(layout.capsules)])
+        data = GameStateData()
+        data.initialize(layout, numAgents - 1)
+        if len(data.agentStates) != numAgents:
+            raise Exception("The layout has no room for %d agents" % numAgents)
+        self.startStates = [agentState.start for agentState in data.agentStates]
+        self.starts = [agentState.start.halfPos + (self.directionIndex[Directions.STOP], 0)
+                       for agentState in data.agentStates]
+        self.foodGrid = data.food
+        self.foodLists = {}
+
+    def getRules(layout, numAgents):
+        """
+        Returns the FastRules for numAgents agents on layout, made once.
+        """
+        key = (id(layout), numAgents)
+        entry = FAST_RULES_CACHE.get(key)
+        if entry is None or entry[0] is not layout:
+            entry = (layout, FastRules(layout, numAgents))
+            FAST_RULES_CACHE[key] = entry
+        return entry[1]
+    getRules = staticmethod(getRules)
+
+    def fromGameState(self, gameState):
+        return gameState.key()
+
+    def toGameState(self, state):
+        return GameState.fromKey(self.layout, state)
+
+    def isWin(self, state):
+        return bool(state[1] & 1)
+
+    def isLose(self, state):
+        return bool(state[1] & 2)
+
+    def getScore(self, state):
+        return float(state[0])
+
+    def getPosition(self, state, agentIndex):
+        x, y = state[4 + 4 * agentIndex: 6 + 4 * agentIndex]
+        return (x / 2.0 if x & 1 else x >> 1, y / 2.0 if y & 1 else y >> 1)
+
+    def getFoodList(self, state):
+        """
+        Returns the positions of the remaining food as a tuple, in the order
+        Grid.asList gives them.  States with the same food share the tuple.
+        """
+        foodList = self.foodLists.get(state[2])
+        if foodList is None:
+            if len(self.foodLists) >= 1024:
+                self.foodLists.clear()
+            grid = self.foodGrid.copy()
+            grid.bits = state[2]
+            foodList = tuple(grid.asList())
+            self.foodLists[state[2]] = foodList
+        return foodList
+
+    def getCapsules(self, state):
+        return [c for c, i in self.capsuleIndex.items() if (state[3] >> i) & 1]
+
+    def getLegalActions(self, state, agentIndex=0):
+        if state[1]:
+            return []
+        base = 4 + 4 * agentIndex
+        x, y, direction = state[base: base + 3]
+        if not (x | y) & 1:
+            cell = (x >> 1) * self.height + (y >> 1)
+            if agentIndex == 0:
+                actions = self.pacmanActions[cell]
+            else:
+                actions = self.ghostActions[cell]
+                if actions is not None:
+                    actions = actions[direction]
+            if actions is not None:
+                return list(actions)
+        conf = Configuration.fromHalfPosition((x, y), GameStateData.KEY_DIRECTIONS[direction])
+        if agentIndex == 0:
+            return PacmanRules.getConfigurationActions(conf, self.layout)
+        return GhostRules.getConfigurationActions(conf, self.layout)
+
+    def generateSuccessor(self, state, agentIndex, action):
+        """
+        Returns the flat state after agent agentIndex plays action.  As with
+        GameState.generateSuccessorUnchecked, the action must be legal and
+        the state must not be terminal; nothing checks either.
+        """
+        s = list(state)
+        flags = s[1]
+        scoreChange = 0
+        dx, dy = Actions._directions[action]
+        base = 4 + 4 * agentIndex
+        if agentIndex == 0:
+            x = s[4] + dx * PacmanRules.PACMAN_HALF_STEPS
+            y = s[5] + dy * PacmanRules.PACMAN_HALF_STEPS
+            s[4] = x
+            s[5] = y
+            if action != Directions.STOP:
+                s[6] = self.directionIndex[action]
+            # Eat, if within half a cell of a grid point
+            nearestX, nearestY = (x + 1) >> 1, (y + 1) >> 1
+            if abs(x - 2 * nearestX) + abs(y - 2 * nearestY) <= 1:
+                bit = 1 << (nearestX * self.height + nearestY)
+                if s[2] & bit:
+                    s[2] ^= bit
+                    scoreChange += 10
+                    if s[2] == 0 and not flags & 2:
+                        scoreChange += 500
+                        flags |= 1
+                capsule = self.capsuleIndex.get((nearestX, nearestY))
+                if capsule is not None and (s[3] >> capsule) & 1:
+                    s[3] ^= 1 << capsule
+                    for timer in range(11, len(s), 4):
+                        s[timer] = SCARED_TIME
+            scoreChange -= TIME_PENALTY
+            ghosts = range(8, len(s), 4)
+        else:
+            timer = s[base + 3]
+            halfSteps = GhostRules.GHOST_HALF_STEPS
+            if timer > 0:
+                halfSteps //= 2
+            x = s[base] + dx * halfSteps
+            y = s[base + 1] + dy * halfSteps
+            if action != Directions.STOP:
+                s[base + 2] = self.directionIndex[action]
+            if timer == 1:
+                x, y = ((x + 1) >> 1) << 1, ((y + 1) >> 1) << 1
+            s[base] = x
+            s[base + 1] = y
+            s[base + 3] = max(0, timer - 1)
+            ghosts = (base,)
+
+        # Collisions, as GhostRules.checkDeath and collide
+        pacmanX, pacmanY = s[4], s[5]
+        for ghost in ghosts:
+            if abs(s[ghost] - pacmanX) + abs(s[ghost + 1] - pacmanY) <= COLLISION_HALF_TOLERANCE:
+                if s[ghost + 3] > 0:
+                    scoreChange += 200
+                    s[ghost: ghost + 4] = self.starts[(ghost - 4) >> 2]
+                elif not flags & 1:
+                    scoreChange -= 500
+                    flags |= 2
+        s[0] += scoreChange
+        s[1] = flags
+        return tuple(s)
+
+
+class FastGameState:
+    """
+    A flat state of FastRules behind the GameState methods that search
+    agents and evaluation functions use.  Successors are FastGameStates too,
+    and are not recorded by explored-state tracking.
+
+    getFoodList returns a tuple shared by states with the same food, and
+    data is the state itself, so code that reads gameState.data.getFoodList()
+    or gameState.data.layout works on both kinds of state.
+    """
+    __slots__ = ('rules', 'state')
+
+    def __init__(self, rules, state):
+        self.rules = rules
+        self.state = state
+
+    def fromGameState(gameState):
+        rules = FastRules.getRules(gameState.data.layout, gameState.getNumAgents())
+        return FastGameState(rules, rules.fromGameState(gameState))
+    fromGameState = staticmethod(fromGameState)
+
+    def toGameState(self):
+        return self.rules.toGameState(self.state)
+
+    data = property(lambda self: self)
+    layout = property(lambda self: self.rules.layout)
+
+    def getLegalActions(self, agentIndex=0):
+        return self.rules.getLegalActions(self.state, agentIndex)
+
+    def generateSuccessor(self, agentIndex, action):
+        if self.state[1]:
+            raise Exception('Can\'t generate a successor of a terminal state.')
+        if action not in self.getLegalActions(agentIndex):
+            raise Exception("Illegal action " + str(action))
+        return self.generateSuccessorUnchecked(agentIndex, action)
+
+    def generateSuccessorUnchecked(self, agentIndex, action):
+        return FastGameState(self.rules, self.rules.generateSuccessor(self.state, agentIndex, action))
+
+    def getPacmanPosition(self):
+        return self.rules.getPosition(self.state, 0)
+
+    def getGhostPosition(self, agentIndex):
+        if agentIndex == 0:
+            raise Exception("Pacman's index passed to getGhostPosition")
+        return self.rules.getPosition(self.state, agentIndex)
+
+    def getGhostPositions(self):
+        return [self.rules.getPosition(self.state, i) for i in range(1, self.getNumAgents())]
+
+    def getGhostStates(self):
+        """
+        Returns AgentStates built from the flat state; changing them has no
+        effect on it.
+        """
+        ghostStates = []
+        for agentIndex in range(1, self.getNumAgents()):
+            x, y, direction, timer = self.state[4 + 4 * agentIndex: 8 + 4 * agentIndex]
+            ghostState = AgentState(self.rules.startStates[agentIndex], False)
+            ghostState.configuration = Configuration.fromHalfPosition(
+                (x, y), GameStateData.KEY_DIRECTIONS[direction])
+            ghostState.scaredTimer = timer
+            ghostStates.append(ghostState)
+        return ghostStates
+
+    def getGhostState(self, agentIndex):
+        if agentIndex == 0 or agentIndex >= self.getNumAgents():
+            raise Exception("Invalid index passed to getGhostState")
+        return self.getGhostStates()[agentIndex - 1]
+
+    def getNumAgents(self):
+        return self.rules.numAgents
+
+    def getScore(self):
+        return self.rules.getScore(self.state)
+
+    def getCapsules(self):
+        return self.rules.getCapsules(self.state)
+
+    def getNumFood(self):
+        return len(self.rules.getFoodList(self.state))
+
+    def getFoodList(self):
+        return self.rules.getFoodList(self.state)
+
+    def isWin(self):
+        return self.rules.isWin(self.state)
+
+    def isLose(self):
+        return self.rules.isLose(self.state)
+
+    def key(self):
+        return self.state
+
+    def __eq__(self, other):
+        return isinstance(other, FastGameState) and self.state == other.state
+
+    def __hash__(self):
+        return hash(self.state)
+
 #############################
 # FRAMEWORK TO START A GAME #
 #############################
@@ -551,6 +1093,9 @@ def readCommand(argv):
                       help='Turns on exception handling and timeouts during games', default=False)
     parser.add_option('--timeout', dest='timeout', type='int',
                       help=default('Maximum length of time an agent can spend computing in a single game'), default=30)
+    parser.add_option('--trackExplored', dest='trackExplored', type='choice',
+                      choices=list(EXPLORED_TRACKERS.keys()),
+                      help=default('How to record explored states: off, count or set'), default='off')
 
     options, otherjunk = parser.parse_args(argv)
     if len(otherjunk) != 0:
@@ -603,6 +1148,7 @@ def readCommand(argv):
     args['record'] = options.record
     args['catchExceptions'] = options.catchExceptions
     args['timeout'] = options.timeout
+    args['trackExplored'] = options.trackExplored
 
     # Special case: recorded games don't use the runGames method or args structure
     if options.gameToReplay != None:
@@ -669,7 +1215,16 @@ def replayGame(layout, actions, display):
     display.finish()
 
 
-def runGames(layout, pacman, ghosts, display, numGames, record, numTraining=0, catchExceptions=False, timeout=30):
+def runGames(layout, pacman, ghosts, display, numGames, record, numTraining=0, catchExceptions=False, timeout=30, trackExplored=None):
+    if trackExplored != None:
+        # Run the games under the requested tracking mode
+        with ExploredTracking(trackExplored) as tracker:
+            games = runGames(layout, pacman, ghosts, display, numGames, record,
+                             numTraining, catchExceptions, timeout)
+            if tracker is not None:
+                print('States explored:', tracker.getNumExplored())
+        return games
+
     import __main__
     __main__.__dict__['_display'] = display
 
@@ -13,6 +13,7 @@
 
 
 import time
+import util
 try:
     import pacman
 except:
@@ -65,9 +66,9 @@ class PacmanGraphics:
         if self.agentCounter == 0:
             self.turn += 1
             if DISPLAY_MOVES:
-                ghosts = [pacman.nearestPoint(
+                ghosts = [util.nearestPoint(
                     state.getGhostPosition(i)) for i in range(1, numAgents)]
-                print("%4d) P: %-8s" % (self.turn, str(pacman.nearestPoint(state.getPacmanPosition()))),
+                print("%4d) P: %-8s" % (self.turn, str(util.nearestPoint(state.getPacmanPosition()))),
                       '| Score: %-5d' % state.score, '| Ghosts:', ghosts)
             if self.turn % DRAW_EVERY == 0:
                 self.draw(state)